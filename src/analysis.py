@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Columnar analysis of the run summaries.
+
+Every result source (a results store, a JSON summary or a directory of
+JSON summaries and stores) is loaded once into a typed pandas table, one row per
+run, and cached on disk until one of its files changes. The statistics
+are computed with group-bys over the whole table:
+
+    table = analysis.load_table(['../data/results'])
+    analysis.aggregate(table, by=['solver', 'timeout'])
+"""
+import hashlib
+import os
+import pickle
+
+import pandas as pd
+
+import results_store
+
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'auction_analysis')
+CACHE_VERSION = 2
+
+COLUMNS = {
+    'experiment': 'category',
+    'solver': 'category',
+    'family': 'category',
+    'dataset': 'object',
+    'timeout': 'float64',
+    'run': 'Int64',
+    'profit': 'float64',
+    'delta_time': 'float64',
+    'nr_items': 'Int64',
+    'nr_orders': 'Int64',
+    'status': 'object',
+    'failure': 'object',
+}
+
+PERCENTILES = (80, 90, 95, 99)
+
+# group of the runs without a value in a group-by column, pandas before 1.1
+# drops the missing keys from the groups, a missing timeout is no budget
+MISSING = 'n/a'
+MISSING_NUMBERS = {'timeout': float('inf'), 'run': -1, 'nr_items': -1,
+                   'nr_orders': -1}
+
+
+def _source_files(path):
+    """Return the files a source is read from."""
+    if os.path.isdir(path):
+        files = []
+        for root, _, names in os.walk(path):
+            for name in names:
+                if name.endswith(('.json', '.josn', '.sqlite')):
+                    files += _source_files(os.path.join(root, name))
+        return sorted(files)
+    files = [path]
+    if path.endswith('.sqlite') and os.path.exists(path + '-wal'):
+        files.append(path + '-wal')
+    return files
+
+
+def _signature(path):
+    stats = [(name, os.stat(name).st_mtime_ns, os.stat(name).st_size)
+             for name in _source_files(path)]
+    return (CACHE_VERSION, stats)
+
+
+def _experiment(path):
+    path = os.path.normpath(path)
+    if path.endswith('.sqlite'):
+        # main.py names every store the same, its directory is the
+        # experiment
+        return os.path.basename(os.path.dirname(path))
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def to_table(models, experiment=None):
+    """Return the typed table of a list of run summaries."""
+    rows = {column: [] for column in COLUMNS}
+    for model in models:
+        file_path = model.get('file_path') or ''
+        rows['experiment'].append(experiment)
+        rows['solver'].append(model.get('solver'))
+        rows['family'].append(
+            os.path.basename(os.path.dirname(file_path)) or None)
+        rows['dataset'].append(
+            os.path.basename(file_path) or model.get('name'))
+        rows['failure'].append(model.get('failure'))
+        rows['status'].append(
+            None if model.get('status') is None else str(model['status']))
+        for column in ('timeout', 'run', 'profit', 'delta_time',
+                       'nr_items', 'nr_orders'):
+            rows[column].append(model.get(column))
+    table = pd.DataFrame(rows)
+    for column in ('timeout', 'profit', 'delta_time'):
+        table[column] = pd.to_numeric(table[column], errors='coerce')
+    return table.astype(COLUMNS)
+
+
+def load_source(path, cache_dir=CACHE_DIR):
+    """Return the table of one source, from the cache if it is current."""
+    path = os.path.abspath(path)
+    signature = _signature(path)
+    cache_path = None
+    if cache_dir:
+        key = hashlib.sha1(path.encode('utf-8')).hexdigest()
+        cache_path = os.path.join(cache_dir, key + '.pkl')
+        try:
+            with open(cache_path, 'rb') as fd:
+                cached_signature, table = pickle.load(fd)
+            if cached_signature == signature:
+                return table
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+    table = to_table(results_store.load_models(path), _experiment(path))
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_path, 'wb') as fd:
+                pickle.dump((signature, table), fd,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass
+    return table
+
+
+def load_table(sources, cache_dir=CACHE_DIR, failures=False):
+    """Return the runs of all the sources in one table, without the
+    failed runs unless asked.
+    """
+    tables = [load_source(path, cache_dir) for path in sources]
+    if not tables:
+        return to_table([])
+    table = pd.concat(tables, ignore_index=True)
+    for column, dtype in COLUMNS.items():
+        if dtype == 'category':
+            # the categories of the sources differ
+            table[column] = table[column].astype('category')
+    if not failures:
+        table = table[table['failure'].isna() & table['solver'].notna()]
+    return table.reset_index(drop=True)
+
+
+def _quantile(percentile):
+    def quantile(values):
+        return values.quantile(percentile / 100)
+    return quantile
+
+
+def _fill_keys(table, by):
+    """Return the table with the missing values of the group-by columns
+    filled in.
+    """
+    filled = {}
+    for column in by:
+        values = table[column]
+        if not values.isna().any():
+            continue
+        if column in MISSING_NUMBERS:
+            filled[column] = values.fillna(MISSING_NUMBERS[column])
+        elif values.dtype.name == 'category':
+            filled[column] = values.cat.add_categories(
+                [MISSING]).fillna(MISSING)
+        else:
+            filled[column] = values.fillna(MISSING)
+    return table.assign(**filled) if filled else table
+
+
+def aggregate(table, by=('solver',)):
+    """Return the profit and time statistics of every group of runs."""
+    stats = dict(
+        runs=('profit', 'size'),
+        profit_total=('profit', 'sum'),
+        profit_mean=('profit', 'mean'),
+        profit_median=('profit', 'median'),
+        profit_min=('profit', 'min'),
+        profit_max=('profit', 'max'),
+        time_total=('delta_time', 'sum'),
+        time_mean=('delta_time', 'mean'),
+    )
+    for percentile in PERCENTILES:
+        stats['time_p{}'.format(percentile)] = (
+            'delta_time', _quantile(percentile))
+    return _fill_keys(table, by).groupby(list(by), observed=True).agg(**stats)
+
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Island model Ant Colony Optimization.
+
+Several colonies run in worker processes, each one with its own pheromone
+trail. Between rounds the best solution migrates to every island and the
+trails are merged, until the shared deadline is reached. The islands
+share the CPU time left on every round and report the CPU time they used.
+"""
+import logging
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import aoc_model
+import base_solution
+import deadline
+
+
+def _island(connection, matrix, name, colony_cls, colony_kwargs, seed,
+            trail_weight):
+    """Worker loop: run the colony for the budget received on every round."""
+    np.random.seed(seed)
+    colony = colony_cls(matrix, name, logging.getLogger(__name__),
+                        **colony_kwargs)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        timeout, cpu_timeout, trail, migrant, migrant_profit = message
+        cpu_start = time.process_time()
+        if trail is not None:
+            colony.merge_trail(trail, trail_weight)
+        if migrant:
+            colony.accept_migrant(migrant, migrant_profit)
+        colony._solve(deadline.Deadline(timeout, cpu_timeout))
+        connection.send((colony.pheromone_trail, colony.best_ant,
+                         colony.get_profit(), colony._winning_bids(),
+                         dict(colony.profile.counters),
+                         time.process_time() - cpu_start))
+    connection.close()
+
+
+class AOCIslandModel(base_solution.BaseSolution):
+    """Ant Colony Optimization running one colony per process."""
+
+    def __init__(self, bids, name, logger,
+                 island_count=None, migration_interval=5.0,
+                 trail_weight=0.5, colony_cls=aoc_model.AOCBaseSolution,
+                 **colony_kwargs):
+        super(AOCIslandModel, self).__init__(bids, name, logger)
+        self._island_count = island_count or os.cpu_count() or 1
+        self._migration_interval = migration_interval
+        self._trail_weight = trail_weight
+        self._colony_cls = colony_cls
+        self._colony_kwargs = colony_kwargs
+        self._status = 'NotStarted'
+
+        self._winning = []
+        self._best_profit = 0.0
+
+    def _get_status(self):
+        return "Solved"
+
+    def get_profit(self):
+        return self._best_profit
+
+    def _winning_bids(self):
+        return list(self._winning)
+
+    def _start_islands(self):
+        islands = []
+        seeds = np.random.randint(0, 2**31 - 1, size=self._island_count)
+        for seed in seeds.tolist():
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_island,
+                args=(child, self._matrix, self._name, self._colony_cls,
+                      self._colony_kwargs, seed, self._trail_weight),
+                daemon=True)
+            process.start()
+            child.close()
+            islands.append((process, parent))
+        return islands
+
+    def _solve(self, deadline):
+        with self.profile.phase("startup"):
+            islands = self._start_islands()
+        trail, migrant, migrant_profit = None, [], 0.0
+        # counters of every colony, they add up over the rounds
+        island_counters = [{} for _ in islands]
+        try:
+            while True:
+                if deadline.expired():
+                    break
+                timeout, cpu_timeout = deadline.worker_budget(
+                    1.0 / len(islands))
+                if deadline.bounded and (
+                        timeout is None or timeout > self._migration_interval):
+                    timeout = self._migration_interval
+                for _, connection in islands:
+                    connection.send((timeout, cpu_timeout, trail, migrant,
+                                     migrant_profit))
+
+                trails = []
+                with self.profile.phase("rounds"):
+                    for index, (_, connection) in enumerate(islands):
+                        (island_trail, ant, profit, winning,
+                         island_counters[index], cpu_time) = connection.recv()
+                        # the parent mostly waits, the islands do the work
+                        deadline.charge(cpu_time)
+                        trails.append(island_trail)
+                        if profit > self._best_profit:
+                            self._best_profit = profit
+                            self._winning = winning
+                            migrant, migrant_profit = ant, profit
+                            self._report_incumbent(profit)
+                            self.profile.count("migrations")
+                self.profile.count("rounds")
+                trail = np.mean(trails, axis=0)
+                self._status = 'PartiallyOptimized'
+                self._logger.debug("Islands best profit => %s",
+                                   self._best_profit)
+                if not deadline.bounded:
+                    self._status = 'Finished'
+                    break
+                if self._stop_requested:
+                    break
+        finally:
+            for process, connection in islands:
+                connection.send(None)
+                connection.close()
+                process.join()
+            for counters in island_counters:
+                self.profile.counters.update(counters)
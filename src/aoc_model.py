@@ -1,18 +1,26 @@
 #reversed!/usr/bin/env python3
 """
-Greedy solution to the winning determination problem.
+Ant Colony Optimization solution to the winning determination problem.
 """
 import time
-import copy
 
 import numpy as np
-import pandas as pd
 
 import base_solution
 
 
 class AOCBaseSolution(base_solution.BaseSolution):
-    """Ant Colony Optimization solution."""
+    """Ant Colony Optimization solution.
+
+    The whole colony advances one bid per epoch: every ant keeps a row in
+    an ants x bids feasibility matrix, the next bid of every ant is sampled
+    at once from that matrix and the neighbours of the chosen bids in the
+    conflict graph are masked out.
+
+    The ants are rows of preallocated arrays: the slots of their chosen
+    bids, how many slots are used and their running profit, so an epoch
+    costs the same whatever the length of the tours.
+    """
 
     def __init__(self, bids, name, logger,
                  ant_count=10, pheromone_decay=0.9,
@@ -25,93 +33,148 @@ class AOCBaseSolution(base_solution.BaseSolution):
         self._greedy_power = greedy_power
         self._status = 'NotStarted'
 
-        # compute average item price for each bit
-        all_bids = list(self._bids.values())
-        self._enhanced_bids = []
-        for bid in all_bids:
-            self._enhanced_bids.append(
-                (bid[0], bid[1], bid[1]/len(bid[0]))
-            )
-        self._enhanced_bids.sort(
-            key=lambda x: x[2],
-            reverse=True)
-
-        # prepare ants
-        self._ants = [[] for _ in range(self._ant_count)]
-        self._pheromone_trail = [
-            1 for _ in range(len(self._enhanced_bids))]
-
-    @staticmethod
-    def _has_conflict(target_bid, accepted_bids):
-        """Return true if the bid has items conflicts
-           with the currently accepted bids.
-        """
-        bid_items = set(target_bid[0])
-        for bid in accepted_bids:
-            if not bid_items.isdisjoint(set(bid[0])):
-                return True
-        return False
+        # order the bids by the precomputed average item price
+        self._enhanced_bids = np.argsort(
+            -self._matrix.price_per_item, kind='stable')
+        self._enhanced_ppi = self._matrix.price_per_item[self._enhanced_bids]
+        self._enhanced_prices = self._matrix.prices[self._enhanced_bids]
+        self._blocking = self.conflict_graph.blocking(self._enhanced_bids)
+
+        # best solution found over all the tours
+        self._best_ant = []
+        self._best_profit = 0.0
+        self._epochs = 0
+
+        # prepare ants, an ant holds at most one bid per item and every
+        # bid without items
+        nr_bids = len(self._enhanced_bids)
+        capacity = min(nr_bids, self._matrix.nr_items +
+                       int(np.count_nonzero(self._matrix.sizes == 0)))
+        self._pheromone_trail = np.ones(nr_bids)
+        self._ant_bids = np.zeros((ant_count, capacity), dtype=np.int64)
+        self._ant_sizes = np.zeros(ant_count, dtype=np.int64)
+        self._ant_profits = np.zeros(ant_count)
+        self._feasible = np.ones((ant_count, nr_bids), dtype=bool)
+        self._new_tour()
+
+    def _new_tour(self):
+        """Send a fresh colony over the bids."""
+        self._ant_sizes[:] = 0
+        self._ant_profits[:] = 0.0
+        self._feasible[:] = True
 
     def _get_status(self):
         return "Solved"
 
     def get_profit(self):
-        return max([self._get_profit(ant) for ant in self._ants])
-
-    @staticmethod
-    def _get_profit(ant):
-        return sum([bid[1] for bid in ant])
-
-    def _solve(self, timeout=None):
-        start_time = time.time()
-        while time.time() - start_time <= timeout:
+        return self._best_profit
+
+    def _winning_bids(self):
+        return self._enhanced_bids[self._best_ant].tolist()
+
+    @property
+    def epochs(self):
+        return self._epochs
+
+    @property
+    def pheromone_trail(self):
+        return self._pheromone_trail
+
+    @property
+    def best_ant(self):
+        """Best solution so far, as positions in the bid ordering."""
+        return list(self._best_ant)
+
+    def merge_trail(self, trail, weight):
+        """Blend a pheromone trail coming from another colony into ours."""
+        self._pheromone_trail *= 1 - weight
+        self._pheromone_trail += weight * np.asarray(trail)
+
+    def accept_migrant(self, ant, profit):
+        """Adopt a better solution found by another colony."""
+        if profit <= self._best_profit:
+            return
+        self._best_profit = float(profit)
+        self._best_ant = list(ant)
+        self._pheromone_trail[self._best_ant] += profit
+
+    def accept_bids(self, bids, profit):
+        """Adopt a better solution found by another solver."""
+        positions = np.empty(len(self._enhanced_bids), dtype=np.int64)
+        positions[self._enhanced_bids] = np.arange(len(self._enhanced_bids))
+        self.accept_migrant(
+            positions[np.asarray(bids, dtype=np.int64)].tolist(), profit)
+
+    def _solve(self, deadline):
+        while not deadline.expired():
+            if self._stop_requested:
+                return
             progress = self.__next_epoch()
+            self._epochs += 1
+            self.profile.count("epochs")
             self._status = 'PartiallyOptimized'
             if not progress:
-                self._status = 'Finished'
-                return
+                if not deadline.bounded:
+                    self._status = 'Finished'
+                    return
+                # every ant has a complete solution, start a new tour
+                self._new_tour()
+                self.profile.count("tours")
+
+    def _update_trail(self):
+        # evaporate pheromone trail
+        self._pheromone_trail *= 1 - self._pheromone_decay
 
     def __next_epoch(self):
-        # construct new solution
-        index_of_chosen_bids = []
-        added_item_to_ant = []
-        for index_ant in range(len(self._ants)):
-            # construct probability to add a bid
-            valid_pheromon_array = []
-            for index_bid, bid in enumerate(self._enhanced_bids):
-                if self._has_conflict(bid, self._ants[index_ant]):
-                    valid_pheromon_array.append(0.0)
-                    continue
-                valid_pheromon_array.append(self._pheromone_trail[index_bid])
-
-            added_item_to_ant.append(any([x != 0.0 for x in valid_pheromon_array]))
-            probability_array = []
-            for index in range(len(self._enhanced_bids)):
-                probability_array.append(
-                    valid_pheromon_array[index]**self._pheromone_power + self._enhanced_bids[index][2]*self._greedy_power
-                )
-            total_power = sum(probability_array)
-            probability_array = list(map(lambda x: x/total_power, probability_array))
-            winner_index_bid = np.random.choice(list(range(len(self._enhanced_bids))), p=probability_array)
-
-            # add winning bid to ant
-            self._ants[index_ant].append(self._enhanced_bids[winner_index_bid])
-            index_of_chosen_bids.append(winner_index_bid)
-
-        ant_fitness = [self._get_profit(ant) for ant in self._ants]
-        max_ant_fitness = max([self._get_profit(ant) for ant in self._ants])
-        index_of_max_fitness = ant_fitness.index(max_ant_fitness)
-        bid_chosen = self._ants[index_of_max_fitness][-1]
-        self._pheromone_trail[self._enhanced_bids.index(bid_chosen)] += max_ant_fitness
+        profile = self.profile
+        with profile.phase("sampling"):
+            # construct probability to add a bid, conflicting bids have none
+            attraction = (self._pheromone_trail**self._pheromone_power +
+                          self._enhanced_ppi*self._greedy_power)
+            active_ants = np.flatnonzero(self._feasible @ attraction > 0)
+            if not active_ants.size:
+                return False
+            # only the ants that can still grow need the cumulative sums
+            cumulative = np.cumsum(
+                self._feasible[active_ants] * attraction, axis=1)
+
+            # sample the next bid of every ant that can still grow
+            thresholds = (np.random.random_sample(active_ants.size) *
+                          cumulative[:, -1])
+            chosen_bids = np.count_nonzero(
+                cumulative <= thresholds[:, None], axis=1)
+        profile.count("bids_sampled", active_ants.size)
+
+        # add winning bid to ant
+        slots = self._ant_sizes[active_ants]
+        self._ant_bids[active_ants, slots] = chosen_bids
+        self._ant_sizes[active_ants] = slots + 1
+        self._ant_profits[active_ants] += self._enhanced_prices[chosen_bids]
+
+        with profile.phase("conflicts"):
+            # mask out the chosen bids and their neighbours
+            rows, columns = self._blocking[chosen_bids].nonzero()
+            self._feasible[active_ants[rows], columns] = False
+        profile.count("conflict_checks", rows.size)
+
+        with profile.phase("fitness"):
+            ant_fitness = self._ant_profits[active_ants]
+            index_of_max_fitness = int(np.argmax(ant_fitness))
+            max_ant_fitness = ant_fitness[index_of_max_fitness]
+        self._pheromone_trail[chosen_bids[index_of_max_fitness]] += max_ant_fitness
+        if max_ant_fitness > self._best_profit:
+            self._best_profit = float(max_ant_fitness)
+            best_ant = active_ants[index_of_max_fitness]
+            self._best_ant = self._ant_bids[
+                best_ant, :self._ant_sizes[best_ant]].tolist()
+            self._report_incumbent(self._best_profit)
         # TODO(mmicu):
-        # - compare how the aoc improves over time
         # - maybe normalize the trail added by the fittest ant to encourage exploration
         # - expose parameters to CLI (pheromone_decay,  pheromone_power, greedy_power, ant_count)
         #   * run experiments with differing parameters
         # - if you have time implement local search
         # - maybe multiply the ants over time
 
-        # evaporate pheromone trail
-        for index in range(len(self._pheromone_trail)):
-            self._pheromone_trail[index] = self._pheromone_trail[index]*(1-self._pheromone_decay)
-        return any(added_item_to_ant)
+        with profile.phase("pheromone"):
+            self._update_trail()
+        return True
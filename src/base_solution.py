@@ -2,29 +2,64 @@
 
 import time
 
+import bid_matrix
+import conflict_graph
+import deadline
+import profiling
+
 
 class BaseSolution(object):
+    # true if the solver makes no random choices, its solution only depends
+    # on the input and how far it gets in its time budget, the result cache
+    # then reuses one run for every repetition
+    DETERMINISTIC = False
+
     def __init__(self, bids, name, logger):
         self._rez = None
         self._delta_time = 0
-        self._bids = {}
-        for index, data in enumerate(bids.items()):
-            self._bids[index] = data
+        if not isinstance(bids, bid_matrix.BidMatrix):
+            bids = bid_matrix.BidMatrix.from_bids(bids)
+        self._matrix = bids
+        self._conflict_graph = None
         self._name = name
         self._logger = logger
 
+        # (seconds since the start, profit) of every improved incumbent
+        self._trajectory = []
+        self._start_time = None
+        self._callback = None
+        self._stop_requested = False
+
+        # phase timers and counters, updated by the solvers
+        self.profile = profiling.Profile()
+
+    @property
+    def conflict_graph(self):
+        """The bid conflict graph, built on first use."""
+        if self._conflict_graph is None:
+            self._conflict_graph = conflict_graph.ConflictGraph(self._matrix)
+        return self._conflict_graph
+
     def all_items(self):
-        all_items = []
-        for items, _ in self._bids.values():
-            all_items += items
-        return set(all_items)
+        return self._matrix.item_names
 
     def get_profit(self):
         raise NotImplemented()
 
+    def _winning_bids(self):
+        raise NotImplemented()
+
+    def winning_bids(self):
+        """Return the indices of the winning bids."""
+        return self._winning_bids()
+
     def _get_status(self):
         return "NotSolved"
 
+    def proved_optimal(self):
+        """Return true if the solver proved its solution is optimal."""
+        return False
+
     def _extra_summary(self):
         pass
 
@@ -37,12 +72,48 @@ class BaseSolution(object):
         self._logger.info(
             "Took              => %s minutes and %s  seconds", minutes, seconds)
 
-    def _solve(self):
+    def _solve(self, deadline):
         raise NotImplemented()
 
-    def solve(self, timeout=None):
+    def _report_incumbent(self, profit):
+        """Record an improved incumbent and pass it to the callback.
+
+        The callback gets `(elapsed_seconds, profit)`, if it returns a true
+        value the solver is asked to stop as soon as possible.
+        """
+        if self._trajectory and profit <= self._trajectory[-1][1]:
+            return
+        if self._start_time is None:
+            # driven through _solve directly, e.g. by the ACO islands
+            self._start_time = time.time()
+        elapsed = time.time() - self._start_time
+        self._trajectory.append((elapsed, profit))
+        if self._callback is not None and self._callback(elapsed, profit):
+            self._stop_requested = True
+
+    def solve(self, timeout=None, callback=None, cpu_timeout=None,
+              reserve=0.0):
+        """Solve the auction, reporting every improved incumbent to
+        `callback(elapsed_seconds, profit)`.
+
+        `timeout` is a wall clock budget in seconds or a `Deadline`, the
+        solver gets the deadline and stops `reserve` seconds before it to
+        extract its best incumbent.
+        """
         start_time = time.time()
-        self._solve(timeout)
+        if isinstance(timeout, deadline.Deadline):
+            solve_deadline = timeout
+        else:
+            solve_deadline = deadline.Deadline(timeout, cpu_timeout, reserve)
+        self._start_time = start_time
+        self._callback = callback
+        self._trajectory = []
+        self._stop_requested = False
+        with self.profile.phase("solve"):
+            self._solve(solve_deadline)
+        with self.profile.phase("extract"):
+            # solvers that only know their final result report it here
+            self._report_incumbent(self.get_profit())
         delta_time = time.time() - start_time
         self._delta_time = delta_time
         return self._rez, self._delta_time
@@ -52,11 +123,12 @@ class BaseSolution(object):
         return {
             "status": self._rez,
             "delta_time": self._delta_time,
-            "nr_items": len(self.all_items()),
-            "nr_orders": len(self._bids),
+            "nr_items": self._matrix.nr_items,
+            "nr_orders": self._matrix.nr_bids,
             "profit": self.get_profit(),
             "file_path": file_path,
             "name": self._name,
-            "solver": self.__class__.__name__
+            "solver": self.__class__.__name__,
+            "trajectory": [list(point) for point in self._trajectory],
+            "profile": self.profile.as_dict(),
         }
-
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for solver throughput and scaling.
+
+Parse, build and solve are timed separately for every solver on fixed
+instance families, the ACO epochs per second and the profit are recorded
+for every time budget. Every measurement is repeated, the fastest time
+and the median of the other metrics are kept with their relative spread
+over the repetitions. A run can be saved as a baseline and later runs
+compared against it, a change within the spread of either run is noise:
+
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --compare baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+import aoc_model
+import aoc_model_second_generation
+import dataset
+import greedy_model
+import lp_model
+import branch_and_bound
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '..', 'data')
+
+FAMILIES = {
+    'custom': os.path.join(DATA_DIR, 'custom_dataset'),
+    'cast': os.path.join(DATA_DIR, 'datasets', 'CAST_test_instance'),
+    'sand': os.path.join(DATA_DIR, 'datasets', 'Sand_test_instance'),
+}
+
+SOLUTIONS = [
+    greedy_model.GreedyNumberOfItems,
+    greedy_model.GreedyBigBet,
+    greedy_model.GreedyAverageItemsPrice,
+    greedy_model.GreedyPortfolio,
+    aoc_model.AOCBaseSolution,
+    aoc_model_second_generation.AOCBaseSolutionSecondGeneration,
+    lp_model.LPModel,
+    branch_and_bound.BranchAndBound,
+]
+
+# solutions whose result does not depend on the time budget
+BUDGET_FREE = (greedy_model.GreedyBase,)
+
+# metrics where a higher value is a regression, the others must not drop
+LOWER_IS_BETTER = ('parse_time', 'cache_time', 'build_time', 'solve_time')
+HIGHER_IS_BETTER = ('profit', 'epochs_per_second')
+
+# timing changes below this many seconds are too short to compare
+MIN_TIME = 0.01
+
+# relative changes of a metric always taken as noise, the timings move
+# more from a run to the next than between the repetitions of a run
+NOISE_FLOOR = {'parse_time': 0.2, 'cache_time': 0.2, 'build_time': 0.2,
+               'solve_time': 0.2, 'epochs_per_second': 0.1, 'profit': 0.0}
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the solutions on fixed instance families.')
+    parser.add_argument('-f', '--families', type=str, action='append',
+                        choices=sorted(FAMILIES),
+                        help='Instance families (default all).')
+    parser.add_argument('-s', '--solutions', type=str, action='append',
+                        choices=[sol.__name__ for sol in SOLUTIONS],
+                        help='Solutions to benchmark (default all).')
+    parser.add_argument('-b', '--budgets', type=float, nargs='+',
+                        default=[1.0],
+                        help='Time budgets in seconds for the solvers.')
+    parser.add_argument('-l', '--limit', type=int, default=None,
+                        help='Files per family, the smallest first.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Repetitions, the fastest time and the median '
+                             'of the other metrics are kept.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the stochastic solutions.')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Write the results to this JSON file.')
+    parser.add_argument('--save-baseline', type=str, default=None,
+                        help='Write the results as the baseline.')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Compare the results against a baseline.')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change flagged as a regression, '
+                             'at least the spread of the repetitions.')
+    return parser
+
+
+def get_files(directory, limit=None):
+    files = []
+    for name in os.listdir(directory):
+        file_path = os.path.join(directory, name)
+        if os.path.isfile(file_path) and not dataset.is_cache(file_path):
+            files.append((os.stat(file_path).st_size, name, file_path))
+    files.sort()
+    return [(name, file_path) for _, name, file_path in files[:limit]]
+
+
+def _times(function, repeat):
+    """Return the time of every call and the last result."""
+    times, result = [], None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start_time)
+    return times, result
+
+
+def _spread(values):
+    """Return the relative spread of repeated measurements."""
+    median = float(np.median(values))
+    if median == 0:
+        return 0.0
+    return (max(values) - min(values)) / abs(median)
+
+
+def _summarize(measures):
+    """Return the fastest time and the median of the other metrics of
+    the repetitions, with their spread.
+    """
+    record = {'spread': {}}
+    for metric, values in measures.items():
+        if metric in LOWER_IS_BETTER:
+            record[metric] = min(values)
+        else:
+            record[metric] = float(np.median(values))
+        record['spread'][metric] = _spread(values)
+    return record
+
+
+def _solve_repeats(solution_cls, matrix, budget, repeat, logger):
+    """Build and solve `repeat` times, return the measures of every
+    repetition.
+    """
+    measures = {'build_time': [], 'solve_time': [], 'profit': []}
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        model = solution_cls(matrix, 'bench', logger)
+        measures['build_time'].append(time.perf_counter() - start_time)
+        start_time = time.perf_counter()
+        model.solve(timeout=budget)
+        solve_time = time.perf_counter() - start_time
+        measures['solve_time'].append(solve_time)
+        measures['profit'].append(model.get_profit())
+        if isinstance(model, aoc_model.AOCBaseSolution):
+            measures.setdefault('epochs', []).append(model.epochs)
+            measures.setdefault('epochs_per_second', []).append(
+                model.epochs / solve_time)
+    return measures
+
+
+def bench_file(file_path, solutions, budgets, repeat, logger):
+    """Return the measurements of every solution on one instance."""
+    parse_times, matrix = _times(
+        lambda: dataset.parse_file(file_path), repeat)
+    dataset.load(file_path)
+    cache_times, _ = _times(lambda: dataset.load(file_path), repeat)
+    record = _summarize({'parse_time': parse_times,
+                         'cache_time': cache_times})
+    record.update({'nr_bids': matrix.nr_bids, 'nr_items': matrix.nr_items})
+    results = {'parse': record}
+
+    for solution_cls in solutions:
+        solution_budgets = budgets
+        if issubclass(solution_cls, BUDGET_FREE):
+            solution_budgets = [None]
+        for budget in solution_budgets:
+            key = solution_cls.__name__
+            if budget is not None:
+                key = '{}@{:g}'.format(key, budget)
+            try:
+                measures = _solve_repeats(solution_cls, matrix, budget,
+                                          repeat, logger)
+            except Exception as exc:
+                logger.warning('%s failed on %s: %s', key, file_path, exc)
+                results[key] = {'error': str(exc)}
+                continue
+            record = _summarize(measures)
+            results[key] = record
+            logger.info('%-50s %s', os.path.basename(file_path) + ' ' + key,
+                        record)
+    return results
+
+
+def run(families, solutions, budgets, limit, repeat, logger):
+    results = {}
+    for family in families:
+        for name, file_path in get_files(FAMILIES[family], limit):
+            for key, record in bench_file(
+                    file_path, solutions, budgets, repeat, logger).items():
+                results['{}/{}/{}'.format(family, name, key)] = record
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the metrics that changed by more than the threshold and
+    the spread of their repetitions, as `(key, metric, baseline, current,
+    relative_change, regression)`.
+    """
+    changes = []
+    for key, record in sorted(results.items()):
+        if key not in baseline:
+            continue
+        for metric, value in record.items():
+            if metric not in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+                continue
+            old = baseline[key].get(metric)
+            if old is None or value is None or old == 0:
+                continue
+            if metric in LOWER_IS_BETTER and abs(value - old) < MIN_TIME:
+                continue
+            change = (value - old) / abs(old)
+            # the noise of the metric in the two runs
+            noise = (record.get('spread', {}).get(metric, 0.0) +
+                     baseline[key].get('spread', {}).get(metric, 0.0))
+            if abs(change) <= max(threshold, NOISE_FLOOR[metric], noise):
+                continue
+            regression = ((metric in LOWER_IS_BETTER and change > 0) or
+                          (metric in HIGHER_IS_BETTER and change < 0))
+            changes.append((key, metric, old, value, change, regression))
+    return changes
+
+
+def main():
+    args = get_parser().parse_args()
+    logging.basicConfig(level='INFO', format='%(asctime)s %(message)s')
+    logger = logging.getLogger(__name__)
+    np.random.seed(args.seed)
+
+    families = args.families or sorted(FAMILIES)
+    solutions = [sol for sol in SOLUTIONS
+                 if not args.solutions or sol.__name__ in args.solutions]
+    results = run(families, solutions, args.budgets, args.limit,
+                  args.repeat, logger)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as fd:
+                json.dump(results, fd, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, 'r') as fd:
+            baseline = json.load(fd)
+        changes = compare(results, baseline, args.threshold)
+        regressions = 0
+        for key, metric, old, value, change, regression in changes:
+            regressions += regression
+            print('{:10} {:60} {:18} {:>12.4g} -> {:<12.4g} ({:+.1%})'.format(
+                'REGRESSION' if regression else 'improved',
+                key, metric, old, value, change))
+        print('{} regressions, {} improvements over {:.0%}'.format(
+            regressions, len(changes) - regressions, args.threshold))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
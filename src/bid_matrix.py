@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Compact, integer indexed representation of an auction.
+
+Item names are interned to dense integers and the bundles are stored
+CSR-style: the items of bid `i` are `items[offsets[i]:offsets[i + 1]]`.
+"""
+
+import numpy as np
+import scipy.sparse
+
+
+class BidMatrix(object):
+    """All the bids of an auction stored in flat NumPy arrays."""
+
+    def __init__(self, item_names, offsets, items, prices):
+        self.item_names = list(item_names)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.items = np.asarray(items, dtype=np.int32)
+        self.prices = np.asarray(prices, dtype=np.float64)
+
+        self.sizes = np.diff(self.offsets)
+        self.price_per_item = self.prices / np.maximum(self.sizes, 1)
+
+    @classmethod
+    def from_bids(cls, bids):
+        """Build the matrix from `{tuple_of_items: price}` or from an
+        iterable of `(tuple_of_items, price)` pairs.
+        """
+        if isinstance(bids, dict):
+            bids = bids.items()
+
+        item_ids = {}
+        offsets = [0]
+        items = []
+        prices = []
+        for bundle, price in bids:
+            for item in bundle:
+                item_id = item_ids.get(item)
+                if item_id is None:
+                    item_id = item_ids[item] = len(item_ids)
+                items.append(item_id)
+            offsets.append(len(items))
+            prices.append(price)
+
+        item_names = [None] * len(item_ids)
+        for item, item_id in item_ids.items():
+            item_names[item_id] = item
+        return cls(item_names, offsets, items, prices)
+
+    @property
+    def nr_bids(self):
+        return len(self.prices)
+
+    @property
+    def nr_items(self):
+        return len(self.item_names)
+
+    def bundle(self, bid):
+        """Return the item ids of a bid."""
+        return self.items[self.offsets[bid]:self.offsets[bid + 1]]
+
+    def bundle_names(self, bid):
+        """Return the original item names of a bid."""
+        return tuple(self.item_names[item] for item in self.bundle(bid))
+
+    def bundles(self):
+        """Return the item ids of every bid as a list of arrays."""
+        return np.split(self.items, self.offsets[1:-1])
+
+    def bid_ids(self):
+        """Return the bid index of every entry in `items`."""
+        return np.repeat(
+            np.arange(self.nr_bids, dtype=np.int32), self.sizes)
+
+    def item_index(self):
+        """Return the inverted item -> bids index, CSR-style.
+
+        The bids containing item `j` are
+        `item_bids[item_offsets[j]:item_offsets[j + 1]]`.
+        """
+        counts = np.bincount(self.items, minlength=self.nr_items)
+        item_offsets = np.zeros(self.nr_items + 1, dtype=np.int64)
+        np.cumsum(counts, out=item_offsets[1:])
+        order = np.argsort(self.items, kind='stable')
+        item_bids = self.bid_ids()[order]
+        return item_offsets, item_bids
+
+    def subset(self, bids):
+        """Return a matrix with only the given bids, in that order.
+
+        Items nobody bids on in the subset are dropped and the rest are
+        renumbered densely.
+        """
+        bids = np.asarray(bids, dtype=np.int64)
+        sizes = self.sizes[bids]
+        offsets = np.zeros(len(bids) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        starts = np.repeat(self.offsets[bids] - offsets[:-1], sizes)
+        items = self.items[starts + np.arange(offsets[-1])]
+
+        used, items = np.unique(items, return_inverse=True)
+        item_names = [self.item_names[item] for item in used.tolist()]
+        return BidMatrix(item_names, offsets, items, self.prices[bids])
+
+    def total_price(self, bids):
+        """Return the summed price of a collection of bid indices."""
+        return float(self.prices[np.asarray(bids, dtype=np.int64)].sum())
+
+    def incidence(self, order=None):
+        """Return the bid-item incidence as a sparse boolean matrix.
+
+        If an order is given the rows follow it, row `i` being the
+        bid `order[i]`.
+        """
+        incidence = scipy.sparse.csr_matrix(
+            (np.ones(len(self.items), dtype=bool), self.items, self.offsets),
+            shape=(self.nr_bids, self.nr_items))
+        if order is not None:
+            incidence = incidence[np.asarray(order)]
+        return incidence
+
+    def save(self, fd, **extra):
+        """Save the matrix arrays, and any extra arrays, as `.npz`."""
+        np.savez(fd, item_names=np.array(self.item_names, dtype=str),
+                 offsets=self.offsets, items=self.items, prices=self.prices,
+                 **extra)
+
+    @classmethod
+    def load(cls, data):
+        """Build the matrix back from the arrays written by `save`."""
+        return cls(data["item_names"].tolist(), data["offsets"],
+                   data["items"], data["prices"])
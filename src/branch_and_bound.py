@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Branch and bound solution to the winning determination problem.
+
+Every node fixes some bids to win and some to lose, its upper bound is the
+LP relaxation of the bids that are still free and don't conflict with the
+winners. The nodes are explored best bound first and branch on the first
+fractional bid in the order of a greedy heuristic, trying to accept it
+before rejecting it. The LP solution of every node is rounded to a
+feasible solution by a greedy pass, to improve the incumbent early.
+
+The LP value only depends on the set of free bids, different branches
+that end up with the same free bids reuse the cached bound.
+"""
+import heapq
+
+import numpy as np
+import pulp
+import scipy
+import scipy.optimize
+
+import base_solution
+import greedy_model
+
+
+# greedy solution that gives the first incumbent for every bid ordering
+ORDERINGS = {
+    'sizes': greedy_model.GreedyNumberOfItems,
+    'prices': greedy_model.GreedyBigBet,
+    'price_per_item': greedy_model.GreedyAverageItemsPrice,
+}
+
+# LP values closer than this to 0 or 1 are integral
+INTEGRALITY_TOLERANCE = 1e-6
+
+# HiGHS came with scipy 1.6, the older versions solve the relaxations with
+# the interior point method, which takes no time limit
+HAS_HIGHS = tuple(int(part) for part in
+                  scipy.__version__.split('.')[:2]) >= (1, 6)
+
+
+class BranchAndBound(base_solution.BaseSolution):
+    DETERMINISTIC = True
+
+    def __init__(self, bids, name, logger, ordering='price_per_item',
+                 cache_size=1 << 16):
+        super(BranchAndBound, self).__init__(bids, name, logger)
+        self._ordering = ordering
+        self._cache_size = cache_size
+        self._rez = pulp.LpStatusNotSolved
+        self._winning = []
+        self._incumbent = []
+        self._upper_bound = None
+        self.nodes = 0
+        self.cache_hits = 0
+
+        matrix = self._matrix
+        self._incidence = matrix.incidence().astype(float).tocsr()
+        self._order = np.argsort(-getattr(matrix, ordering), kind='stable')
+        # position of every bid in the greedy order
+        self._position = np.empty(matrix.nr_bids, dtype=np.int64)
+        self._position[self._order] = np.arange(matrix.nr_bids)
+        self._bundles = matrix.bundles()
+
+    def _get_status(self):
+        return pulp.LpStatus[self._rez]
+
+    def proved_optimal(self):
+        return self._rez == pulp.LpStatusOptimal
+
+    def set_incumbent(self, bids):
+        """Start from a feasible set of winning bids, if it is better than
+        the greedy start.
+        """
+        self._incumbent = list(bids)
+
+    def get_profit(self):
+        return self._matrix.total_price(self._winning)
+
+    def _winning_bids(self):
+        return list(self._winning)
+
+    @property
+    def gap(self):
+        """Relative gap between the profit and the best open bound."""
+        if self._rez == pulp.LpStatusOptimal or self._upper_bound is None:
+            return 0.0
+        profit = self.get_profit()
+        return (max(self._upper_bound - profit, 0.0) /
+                max(abs(self._upper_bound), 1e-9))
+
+    def _extra_summary(self):
+        self._logger.info("Explored nodes    => %s", self.nodes)
+        self._logger.info("Cache hits        => %s", self.cache_hits)
+        self._logger.info("Optimality gap    => %.4f", self.gap)
+
+    def get_summary(self, file_path):
+        summary = super(BranchAndBound, self).get_summary(file_path)
+        summary["gap"] = self.gap
+        summary["nodes"] = self.nodes
+        return summary
+
+    def _relaxation(self, free, time_limit):
+        """Solve the LP relaxation over the free bids.
+
+        Return `(value, x)` with the LP value of every free bid, or None if
+        the solver ran out of time.
+        """
+        bids = np.flatnonzero(free)
+        if not len(bids):
+            return 0.0, np.zeros(0)
+        constraints = self._incidence[bids].T.tocsr()
+        # only the items some free bid asks for constrain the LP
+        constraints = constraints[np.diff(constraints.indptr) > 0]
+        if HAS_HIGHS:
+            method, options = 'highs', {}
+            if time_limit is not None:
+                options['time_limit'] = max(time_limit, 1e-3)
+        else:
+            method, options = 'interior-point', {'sparse': True}
+        result = scipy.optimize.linprog(
+            -self._matrix.prices[bids], A_ub=constraints,
+            b_ub=np.ones(constraints.shape[0]), bounds=(0, 1),
+            method=method, options=options)
+        if result.status != 0:
+            return None
+        return -result.fun, result.x
+
+    def _round(self, winners, free, x):
+        """Complete the winners greedily, the bids with the largest LP
+        value first, and return the bids of the solution.
+        """
+        occupied = np.zeros(self._matrix.nr_items, dtype=bool)
+        for bid in winners:
+            occupied[self._bundles[bid]] = True
+        bids = np.flatnonzero(free)
+        order = bids[np.lexsort((self._position[bids], -x))]
+        solution = list(winners)
+        for bid in order.tolist():
+            bundle = self._bundles[bid]
+            if not occupied[bundle].any():
+                occupied[bundle] = True
+                solution.append(bid)
+        return solution
+
+    def _solve(self, deadline):
+        self._rez = pulp.LpStatusNotSolved
+        self._upper_bound = None
+        self.nodes = 0
+        self.cache_hits = 0
+
+        start = ORDERINGS[self._ordering](self._matrix, self._name,
+                                          self._logger)
+        with self.profile.phase("start"):
+            start.solve(timeout=deadline)
+        self._winning = sorted(start.winning_bids())
+        if (self._matrix.total_price(self._incumbent) >
+                self._matrix.total_price(self._winning)):
+            self._winning = sorted(self._incumbent)
+        self._report_incumbent(self.get_profit())
+        with self.profile.phase("search"):
+            optimal = self._search(deadline)
+        if optimal:
+            self._rez = pulp.LpStatusOptimal
+        self.profile.count("nodes", self.nodes)
+        self.profile.count("cache_hits", self.cache_hits)
+
+    def _search(self, deadline):
+        """Best bound first search, return true if the incumbent is optimal.
+
+        The heap holds `(-bound, counter, winners, free)`, the winners
+        are the bids fixed to win and `free` masks the undecided bids.
+        """
+        matrix = self._matrix
+        graph = self.conflict_graph
+        prices = matrix.prices
+        profile = self.profile
+        cache = {}
+        best = self.get_profit()
+        counter = 0
+
+        # before its LP the root is bounded by the best average price any
+        # bid pays for every item
+        item_bound = np.zeros(matrix.nr_items)
+        np.maximum.at(item_bound, matrix.items,
+                      np.repeat(np.maximum(matrix.price_per_item, 0),
+                                matrix.sizes))
+        free = matrix.prices > 0
+        heap = [(-item_bound.sum(), counter, (), free)]
+        while heap:
+            if self._stop_requested:
+                break
+            time_limit = deadline.remaining()
+            if time_limit is not None and time_limit <= 0:
+                break
+            node = heap[0]
+            bound, _, winners, free = node
+            if -bound <= best + 1e-9 * max(1.0, abs(best)):
+                # every open node is worse than the incumbent
+                heap = []
+                break
+            heapq.heappop(heap)
+            self.nodes += 1
+
+            profit = float(prices[list(winners)].sum())
+            key = free.tobytes()
+            relaxation = cache.get(key)
+            if relaxation is None:
+                with profile.phase("relaxation"):
+                    relaxation = self._relaxation(free, time_limit)
+                if relaxation is None:
+                    heapq.heappush(heap, node)
+                    break
+                if len(cache) < self._cache_size:
+                    cache[key] = relaxation
+            else:
+                self.cache_hits += 1
+            value, x = relaxation
+            node_bound = profit + value
+            if node_bound <= best + 1e-9 * max(1.0, abs(best)):
+                continue
+
+            with profile.phase("rounding"):
+                solution = self._round(winners, free, x)
+                solution_profit = matrix.total_price(solution)
+            if solution_profit > best:
+                best = solution_profit
+                self._winning = sorted(solution)
+                self._report_incumbent(best)
+
+            bids = np.flatnonzero(free)
+            fractional = bids[(x > INTEGRALITY_TOLERANCE) &
+                              (x < 1 - INTEGRALITY_TOLERANCE)]
+            if not len(fractional):
+                # the rounding kept the integral LP solution
+                continue
+            bid = int(fractional[np.argmin(self._position[fractional])])
+
+            reject = free.copy()
+            reject[bid] = False
+            accept = reject.copy()
+            accept[graph.neighbors(bid)] = False
+            # on equal bounds the accepting child, pushed last, goes first
+            counter -= 1
+            heapq.heappush(heap, (-node_bound, counter, winners, reject))
+            counter -= 1
+            heapq.heappush(heap, (-node_bound, counter, winners + (bid,),
+                                  accept))
+
+        self._upper_bound = max([-bound for bound, _, _, _ in heap] + [best])
+        return not heap
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Conflict graph of an auction.
+
+Two bids are neighbours if they share at least one item, so at most one
+bid of every edge can win. The graph is built once per instance from the
+inverted item -> bids index and stored as a sparse CSR adjacency.
+"""
+
+import numpy as np
+import scipy.sparse
+
+
+class ConflictGraph(object):
+    """Sparse bid conflict graph with degree and weight statistics."""
+
+    def __init__(self, matrix):
+        self._matrix = matrix
+        item_offsets, item_bids = matrix.item_index()
+
+        # items x bids, every row lists the bids competing for one item
+        item_incidence = scipy.sparse.csr_matrix(
+            (np.ones(len(item_bids), dtype=bool), item_bids, item_offsets),
+            shape=(matrix.nr_items, matrix.nr_bids))
+        adjacency = (item_incidence.T @ item_incidence).tocsr()
+        adjacency.setdiag(False)
+        adjacency.eliminate_zeros()
+        adjacency.sort_indices()
+        self.adjacency = adjacency
+
+        self.degrees = np.diff(adjacency.indptr)
+        # total price of the bids a bid competes with
+        self.weights = adjacency @ matrix.prices
+
+    @property
+    def nr_edges(self):
+        return int(self.adjacency.nnz // 2)
+
+    def neighbors(self, bid):
+        """Return the bids that share at least one item with `bid`."""
+        indptr = self.adjacency.indptr
+        return self.adjacency.indices[indptr[bid]:indptr[bid + 1]]
+
+    def has_conflict(self, bid, other):
+        """Return true if the two bids share an item."""
+        neighbors = self.neighbors(bid)
+        position = np.searchsorted(neighbors, other)
+        return position < len(neighbors) and neighbors[position] == other
+
+    def blocking(self, order=None):
+        """Return the adjacency with self loops, i.e. the bids that become
+        infeasible once a bid is accepted.
+
+        If an order is given rows and columns follow it.
+        """
+        blocking = (self.adjacency +
+                    scipy.sparse.identity(self._matrix.nr_bids, dtype=bool,
+                                          format='csr')).tocsr()
+        if order is not None:
+            order = np.asarray(order)
+            blocking = blocking[order][:, order]
+        return blocking
+
+    def stats(self):
+        """Return the degree and weight statistics of the graph."""
+        nr_bids = self._matrix.nr_bids
+        max_edges = nr_bids * (nr_bids - 1) / 2
+        return {
+            "nr_edges": self.nr_edges,
+            "density": self.nr_edges / max_edges if max_edges else 0.0,
+            "mean_degree": float(self.degrees.mean()) if nr_bids else 0.0,
+            "max_degree": int(self.degrees.max()) if nr_bids else 0,
+            "mean_weight": float(self.weights.mean()) if nr_bids else 0.0,
+            "max_weight": float(self.weights.max()) if nr_bids else 0.0,
+        }
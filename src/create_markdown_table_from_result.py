@@ -4,18 +4,22 @@ Create a markdown Table from a summary file.
 """
 import argparse
 import os
-import json
+
+import results_store
 
 
 def get_parser():
     """Return a CLI parser."""
     parser = argparse.ArgumentParser()
     parser.add_argument('SOURCE', type=str,
-                        help='JSON summary')
+                        help='JSON summary or results store')
 
     parser.add_argument('DEST', type=str,
                         help='Destination of the markdown file')
 
+    parser.add_argument('--solver', type=str, default=None,
+                        help='Only the runs of this solver')
+
     return parser
 
 
@@ -24,7 +28,10 @@ def main():
     parser = get_parser()
     args = parser.parse_args()
 
-    data = json.loads(open(os.path.abspath(args.SOURCE), 'r').read())
+    filters = {}
+    if args.solver:
+        filters['solver'] = args.solver
+    models = results_store.load_models(os.path.abspath(args.SOURCE), **filters)
 
     with open(args.DEST, 'w+') as fd:
         fd.writelines([
@@ -34,7 +41,9 @@ def main():
             '|           Model Name           | Nr. Orders | Nr. Items  |   Profit   | Duration (seconds) |\n',
             '|--------------------------------|------------|------------|------------|--------------------|\n',
         ])
-        for item in data['models']:
+        for item in models:
+            if item.get('failure'):
+                continue
             # import pdb; pdb.set_trace()
             # try:
             time = float(item['delta_time'])
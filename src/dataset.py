@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Dataset loader.
+
+Every auction file is parsed once into a `BidMatrix` and a binary `.npz`
+cache is saved next to it, later runs load the cache instead of the text.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+import bid_matrix
+
+
+CACHE_SUFFIX = '.npz'
+# bump when the parser or the cache layout changes
+CACHE_VERSION = 1
+
+
+def cache_path(file_path):
+    return file_path + CACHE_SUFFIX
+
+
+def is_cache(file_path):
+    return file_path.endswith(CACHE_SUFFIX)
+
+
+def _source_stamp(file_path):
+    stat = os.stat(file_path)
+    return np.array([CACHE_VERSION, stat.st_size, stat.st_mtime_ns],
+                    dtype=np.int64)
+
+
+def parse_file(file_path):
+    """Parse an auction file, keeping the best price of every bundle.
+
+    Two formats are supported, the first line holds the number of items
+    and the number of bids and if it ends with `#` every bid line is
+    `index price item ... #`, otherwise it is `price item ...`.
+    """
+    with open(file_path, "r") as fd:
+        lines = fd.read().splitlines()
+    if not lines:
+        return bid_matrix.BidMatrix.from_bids([])
+
+    indexed = lines[0].rstrip().endswith("#")
+    bundles = []
+    prices = []
+    positions = {}
+    for line in lines[1:]:
+        fields = line.split()
+        if indexed:
+            fields = [field for field in fields[1:] if field != "#"]
+        if not fields:
+            continue
+        money, *items = fields
+        money = float(money)
+
+        # the same bundle can be listed in a different order
+        key = tuple(sorted(items))
+        position = positions.get(key)
+        if position is None:
+            positions[key] = len(bundles)
+            bundles.append(items)
+            prices.append(money)
+        elif money > prices[position]:
+            prices[position] = money
+
+    return bid_matrix.BidMatrix.from_bids(zip(bundles, prices))
+
+
+def _save_cache(matrix, file_path):
+    """Write the cache atomically, concurrent runs may load the same file."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    try:
+        fd, tmp_path = tempfile.mkstemp(suffix=CACHE_SUFFIX, dir=directory)
+    except OSError:
+        # read only dataset directory, run without a cache
+        return
+    try:
+        with os.fdopen(fd, "wb") as tmp_fd:
+            matrix.save(tmp_fd, source=_source_stamp(file_path))
+        os.replace(tmp_path, cache_path(file_path))
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_cache(file_path):
+    """Return the cached matrix or None if it is missing or stale."""
+    try:
+        with np.load(cache_path(file_path), allow_pickle=False) as data:
+            if not np.array_equal(data["source"], _source_stamp(file_path)):
+                return None
+            return bid_matrix.BidMatrix.load(data)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def load(file_path, use_cache=True):
+    """Return the bid matrix of an auction file."""
+    if use_cache:
+        matrix = _load_cache(file_path)
+        if matrix is not None:
+            return matrix
+
+    matrix = parse_file(file_path)
+    if use_cache:
+        _save_cache(matrix, file_path)
+    return matrix
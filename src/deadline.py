@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Time budget of a solve.
+
+A deadline starts when it is created and carries a wall clock budget and
+a CPU time budget, both in seconds, and the time reserved at the end for
+extracting the result. Solvers check it cooperatively in their loops and
+return their best incumbent once it has expired.
+
+The CPU time of a process doesn't count the work of its children, the
+solvers running workers give each one a share of the CPU time left with
+`worker_budget` and `charge` the deadline with the CPU time they report.
+"""
+import time
+
+
+class Deadline(object):
+    """Wall clock and CPU time budget, any of them can be unbounded."""
+
+    def __init__(self, timeout=None, cpu_timeout=None, reserve=0.0):
+        self.timeout = timeout
+        self.cpu_timeout = cpu_timeout
+        self.reserve = reserve
+        self._start = time.monotonic()
+        self._cpu_start = time.process_time()
+        self._cpu_charged = 0.0
+
+    @property
+    def bounded(self):
+        return self.timeout is not None or self.cpu_timeout is not None
+
+    def elapsed(self):
+        """Wall clock seconds since the start."""
+        return time.monotonic() - self._start
+
+    def cpu_elapsed(self):
+        """CPU seconds of this process since the start, and of the workers
+        charged to the deadline.
+        """
+        return time.process_time() - self._cpu_start + self._cpu_charged
+
+    def charge(self, cpu_seconds):
+        """Count CPU seconds spent by a worker process."""
+        self._cpu_charged += cpu_seconds
+
+    def wall_remaining(self):
+        """Wall clock seconds left, None without a wall clock budget."""
+        if self.timeout is None:
+            return None
+        return max(self.timeout - self.elapsed() - self.reserve, 0.0)
+
+    def cpu_remaining(self):
+        """CPU seconds left, None without a CPU time budget."""
+        if self.cpu_timeout is None:
+            return None
+        return max(self.cpu_timeout - self.cpu_elapsed() - self.reserve, 0.0)
+
+    def remaining(self):
+        """Seconds left before the result must be extracted, None if the
+        deadline is unbounded.
+        """
+        left = [value for value in (self.wall_remaining(),
+                                    self.cpu_remaining())
+                if value is not None]
+        if not left:
+            return None
+        return min(left)
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def worker_budget(self, share=1.0):
+        """Return `(timeout, cpu_timeout)` of a worker running in parallel
+        with other ones, the wall clock time left and `share` of the CPU time
+        left.
+        """
+        cpu_timeout = self.cpu_remaining()
+        if cpu_timeout is not None:
+            cpu_timeout *= share
+        return self.wall_remaining(), cpu_timeout
+
+    def split(self, share):
+        """Return a deadline for a phase that gets `share` of the wall clock
+        and CPU time left, with the same reserve.
+        """
+        timeout = cpu_timeout = None
+        if self.timeout is not None:
+            timeout = max(self.timeout - self.elapsed(), 0.0) * share
+        if self.cpu_timeout is not None:
+            cpu_timeout = max(self.cpu_timeout - self.cpu_elapsed(),
+                              0.0) * share
+        return Deadline(timeout, cpu_timeout, self.reserve)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Synthetic auction instances.
+
+The instances are written in the formats read by `dataset.parse_file`,
+in chunks of bids drawn at once with NumPy, so the memory stays bounded
+whatever the number of bids. The families follow the samples we have:
+
+ * uniform - items drawn uniformly, random prices (Sand instances)
+ * arbitrary - items drawn uniformly, superadditive prices over common
+   item values
+ * matching - a take off and a landing slot at two airports
+ * paths - the edges of a random walk on a grid of cities
+ * regions - the cells of a random walk on a grid of regions
+ * scheduling - consecutive time slots of a machine
+
+The bundle size distribution gives the number of items of the uniform
+and arbitrary bids, the steps of the walks and the length of the jobs,
+matching bids always hold two items. The same seed and chunk size give
+the same instance. Like in the samples some bundles come up more than
+once, the parser only keeps their best price.
+
+    python generator.py paths ../data/generated -b 10000 100000 1000000
+"""
+import argparse
+import os
+
+import numpy as np
+
+
+FAMILIES = ('arbitrary', 'matching', 'paths', 'regions', 'scheduling',
+            'uniform')
+
+# the CAST families are written in the indexed format
+INDEXED_FAMILIES = ('arbitrary', 'matching', 'paths', 'regions',
+                    'scheduling')
+
+SIZE_DISTRIBUTIONS = ('constant', 'uniform', 'decay', 'normal')
+
+# bundle entries drawn at once, bounds the memory of a chunk
+CHUNK_ENTRIES = 1 << 20
+
+# airports of the matching family
+AIRPORTS = 4
+
+# growth of the price with the bundle size of the superadditive families
+SUPERADDITIVITY = 0.2
+
+
+def bundle_sizes(random_state, count, distribution, mean_size, max_size):
+    """Draw `count` bundle sizes between 1 and `max_size`."""
+    if distribution == 'constant':
+        sizes = np.full(count, int(round(mean_size)))
+    elif distribution == 'uniform':
+        sizes = random_state.randint(1, int(2 * mean_size), size=count)
+    elif distribution == 'decay':
+        # one item, then another one with probability 1 - 1 / mean_size
+        sizes = random_state.geometric(1.0 / mean_size, size=count)
+    elif distribution == 'normal':
+        sizes = np.rint(random_state.normal(mean_size, mean_size / 3.0,
+                                            size=count))
+    else:
+        raise ValueError('Unknown size distribution {}'.format(distribution))
+    return np.clip(sizes, 1, max_size).astype(np.int64)
+
+
+def _mask(sizes, width):
+    """Return the mask of the first `sizes[i]` entries of every row."""
+    return np.arange(width)[None, :] < sizes[:, None]
+
+
+def _distinct(random_state, items, mask, nr_items):
+    """Draw the duplicate items of every row again, until there are none."""
+    rows = np.arange(items.shape[0])[:, None]
+    while True:
+        # the masked entries sort last and are never duplicates
+        keys = np.where(mask, items, nr_items + np.arange(items.shape[1]))
+        order = np.argsort(keys, axis=1, kind='stable')
+        ordered = keys[rows, order]
+        duplicate = ordered[:, 1:] == ordered[:, :-1]
+        if not duplicate.any():
+            return items
+        row, column = np.nonzero(duplicate)
+        items[row, order[row, column + 1]] = random_state.randint(
+            nr_items, size=row.size)
+
+
+def _unique(items, mask):
+    """Mask out the duplicate items of every row instead."""
+    fill = np.iinfo(np.int64).max
+    items = np.sort(np.where(mask, items, fill), axis=1)
+    mask = items != fill
+    mask[:, 1:] &= items[:, 1:] != items[:, :-1]
+    return items, mask
+
+
+def _walks(random_state, sizes, side):
+    """Random walks of `sizes[i]` steps on a `side` x `side` grid, return
+    the cells of every walk, one more than its steps.
+    """
+    count, width = len(sizes), int(sizes.max()) + 1
+    cells = np.empty((count, width, 2), dtype=np.int64)
+    cells[:, 0] = random_state.randint(side, size=(count, 2))
+    moves = np.array([[0, 1], [0, -1], [1, 0], [-1, 0]])
+    for step in range(1, width):
+        move = moves[random_state.randint(4, size=count)]
+        target = cells[:, step - 1] + move
+        # bounce back from the border of the grid
+        outside = (target < 0) | (target >= side)
+        cells[:, step] = np.where(outside, cells[:, step - 1] - move, target)
+    return cells
+
+
+def _uniform(random_state, sizes, nr_items):
+    width = int(sizes.max())
+    mask = _mask(sizes, width)
+    items = random_state.randint(nr_items, size=(len(sizes), width))
+    items = _distinct(random_state, items, mask, nr_items)
+    return items, mask, random_state.random_sample(len(sizes))
+
+
+def _arbitrary(random_state, sizes, nr_items, values):
+    items, mask, _ = _uniform(random_state, sizes, nr_items)
+    value = np.where(mask, values[items], 0).sum(axis=1)
+    prices = (value * sizes ** SUPERADDITIVITY *
+              random_state.uniform(0.9, 1.1, size=len(sizes)))
+    return items, mask, prices
+
+
+def _matching(random_state, count, nr_items, values):
+    slots = max(nr_items // AIRPORTS, 1)
+    start = random_state.randint(AIRPORTS, size=count)
+    # land at another airport, later in the day
+    end = (start + random_state.randint(1, AIRPORTS, size=count)) % AIRPORTS
+    take_off = random_state.randint(slots, size=count)
+    flight = random_state.randint(1, max(slots // 4, 1) + 1, size=count)
+    landing = np.minimum(take_off + flight, slots - 1)
+    items = np.stack([start * slots + take_off, end * slots + landing],
+                     axis=1)
+    mask = np.ones(items.shape, dtype=bool)
+    prices = (values[items].sum(axis=1) *
+              random_state.uniform(0.8, 1.2, size=count))
+    return items, mask, prices
+
+
+def _paths(random_state, sizes, nr_items, values):
+    # a side x side grid has 2 * side * (side - 1) edges
+    side = max(int((1 + np.sqrt(1 + 2 * nr_items)) / 2), 2)
+    cells = _walks(random_state, sizes, side)
+    first, second = cells[:, :-1], cells[:, 1:]
+    low = np.minimum(first, second)
+    horizontal = first[..., 0] == second[..., 0]
+    edges = np.where(horizontal,
+                     low[..., 0] * (side - 1) + low[..., 1],
+                     side * (side - 1) + low[..., 1] * (side - 1) +
+                     low[..., 0])
+    items, mask = _unique(edges, _mask(sizes, edges.shape[1]))
+    items = np.where(mask, items, 0)
+    prices = (np.where(mask, values[items], 0).sum(axis=1) *
+              random_state.uniform(1.0, 1.5, size=len(sizes)))
+    return items, mask, prices
+
+
+def _regions(random_state, sizes, nr_items, values):
+    side = max(int(np.sqrt(nr_items)), 1)
+    cells = _walks(random_state, sizes - 1, side)
+    regions = cells[..., 0] * side + cells[..., 1]
+    items, mask = _unique(regions, _mask(sizes, regions.shape[1]))
+    items = np.where(mask, items, 0)
+    prices = (np.where(mask, values[items], 0).sum(axis=1) *
+              mask.sum(axis=1) ** SUPERADDITIVITY *
+              random_state.uniform(0.9, 1.1, size=len(sizes)))
+    return items, mask, prices
+
+
+def _scheduling(random_state, sizes, nr_items):
+    sizes = np.minimum(sizes, nr_items)
+    width = int(sizes.max())
+    start = random_state.randint(0, nr_items - sizes + 1)
+    items = start[:, None] + np.arange(width)[None, :]
+    mask = _mask(sizes, width)
+    # the shorter the deadline after the job, the more it pays per slot
+    slack = random_state.randint(0, nr_items - start - sizes + 1)
+    prices = sizes * (1.0 + 1.0 / (1.0 + slack)) * random_state.uniform(
+        0.9, 1.1, size=len(sizes))
+    return np.where(mask, items, 0), mask, prices
+
+
+def generate(family, nr_bids, nr_items, sizes='decay', mean_size=5.0,
+             max_size=None, seed=0):
+    """Yield the bids of an instance in chunks of `(offsets, items,
+    prices)` arrays, the items of bid `i` of a chunk being
+    `items[offsets[i]:offsets[i + 1]]`.
+    """
+    if family not in FAMILIES:
+        raise ValueError('Unknown family {}'.format(family))
+    max_size = min(max_size or int(4 * mean_size), nr_items)
+    random_state = np.random.RandomState(seed)
+    # common values of the items, the bids value them around them
+    values = random_state.uniform(1.0, 100.0, size=nr_items + 1)
+    chunk_size = max(CHUNK_ENTRIES // (max_size + 1), 1)
+    for start in range(0, nr_bids, chunk_size):
+        count = min(chunk_size, nr_bids - start)
+        chunk_sizes = bundle_sizes(random_state, count, sizes, mean_size,
+                                   max_size)
+        if family == 'uniform':
+            items, mask, prices = _uniform(random_state, chunk_sizes,
+                                           nr_items)
+        elif family == 'arbitrary':
+            items, mask, prices = _arbitrary(random_state, chunk_sizes,
+                                             nr_items, values)
+        elif family == 'matching':
+            items, mask, prices = _matching(random_state, count, nr_items,
+                                            values)
+        elif family == 'paths':
+            items, mask, prices = _paths(random_state, chunk_sizes,
+                                         nr_items, values)
+        elif family == 'regions':
+            items, mask, prices = _regions(random_state, chunk_sizes,
+                                           nr_items, values)
+        else:
+            items, mask, prices = _scheduling(random_state, chunk_sizes,
+                                              nr_items)
+        offsets = np.concatenate([[0], np.cumsum(mask.sum(axis=1))])
+        yield offsets, items[mask], prices
+
+
+def write_instance(path, family, nr_bids, nr_items, indexed=None,
+                   **options):
+    """Write a generated instance, in the indexed format of the CAST
+    instances unless `indexed` says otherwise.
+    """
+    if indexed is None:
+        indexed = family in INDEXED_FAMILIES
+    with open(path, 'w') as fd:
+        if indexed:
+            fd.write('{} {} #\n'.format(nr_items, nr_bids))
+        else:
+            fd.write('{} {}\n'.format(nr_items, nr_bids))
+        bid = 0
+        for offsets, items, prices in generate(family, nr_bids, nr_items,
+                                               **options):
+            names = items.astype(str)
+            prices = np.char.mod('%.5f', prices)
+            lines = []
+            for index in range(len(prices)):
+                bundle = names[offsets[index]:offsets[index + 1]]
+                if indexed:
+                    lines.append('{}\t{}\t{}\t#\n'.format(
+                        bid, prices[index], '\t'.join(bundle)))
+                else:
+                    lines.append('{} {}\n'.format(
+                        prices[index], ' '.join(bundle)))
+                bid += 1
+            fd.writelines(lines)
+
+
+def get_parser():
+    """Return a CLI parser."""
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic auction instances.')
+    parser.add_argument('FAMILY', type=str, choices=FAMILIES)
+    parser.add_argument('OUTPUT', type=str,
+                        help='Directory of the instances.')
+    parser.add_argument('-b', '--bids', type=int, nargs='+',
+                        default=[10000],
+                        help='Bids of every instance, one file each.')
+    parser.add_argument('-i', '--items', type=int, default=None,
+                        help='Items of the instances (default a tenth of '
+                             'the bids).')
+    parser.add_argument('--sizes', type=str, default='decay',
+                        choices=SIZE_DISTRIBUTIONS,
+                        help='Bundle size distribution.')
+    parser.add_argument('--mean-size', type=float, default=5.0,
+                        help='Mean bundle size.')
+    parser.add_argument('--max-size', type=int, default=None,
+                        help='Largest bundle (default four times the mean).')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', type=str, default=None,
+                        choices=['indexed', 'plain'],
+                        help='Line format (default the one of the family '
+                             'samples).')
+    return parser
+
+
+def main():
+    """Main entry point."""
+    args = get_parser().parse_args()
+    if not os.path.isdir(args.OUTPUT):
+        os.makedirs(args.OUTPUT)
+    indexed = None if args.format is None else args.format == 'indexed'
+    for nr_bids in args.bids:
+        nr_items = args.items or max(nr_bids // 10, 1)
+        path = os.path.join(args.OUTPUT,
+                            '{}_{}.txt'.format(args.FAMILY, nr_bids))
+        write_instance(path, args.FAMILY, nr_bids, nr_items, indexed=indexed,
+                       sizes=args.sizes, mean_size=args.mean_size,
+                       max_size=args.max_size, seed=args.seed)
+        print('Wrote {}'.format(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,18 +3,52 @@
 Greedy solution to the winning determination problem.
 """
 
+import concurrent.futures
 import os
 import datetime
 import time
 
-
-import pulp
+import numpy as np
 
 import base_solution
+import deadline
+
+
+# bids visited between two checks of the deadline
+CHECK_INTERVAL = 1024
+
+# below this many bids the portfolio runs its orderings in process, a
+# pass is faster than starting the workers
+MIN_PARALLEL_BIDS = 20000
+
 
+def greedy_pass(bundles, nr_items, order, deadline=None):
+    """Accept the bids in the given order, skipping the conflicting ones.
+
+    A single occupied-items mask is kept for the whole pass so every bid
+    is checked and marked in time proportional to its bundle size. The
+    pass stops early, keeping the accepted bids, once the deadline has
+    expired. Return the accepted bids and the number of checked bids.
+    """
+    occupied = np.zeros(nr_items, dtype=bool)
+    accepted = []
+    checked = 0
+    for position, bid in enumerate(order.tolist()):
+        if (deadline is not None and position % CHECK_INTERVAL == 0
+                and deadline.expired()):
+            break
+        checked += 1
+        bundle = bundles[bid]
+        if occupied[bundle].any():
+            continue
+        occupied[bundle] = True
+        accepted.append(bid)
+    return accepted, checked
 
 
 class GreedyBase(base_solution.BaseSolution):
+    DETERMINISTIC = True
+
     def __init__(self, bids, name, logger):
         super(GreedyBase, self).__init__(bids, name, logger)
         self._accepted_bids = []
@@ -23,71 +57,164 @@ class GreedyBase(base_solution.BaseSolution):
         return "Solved"
 
     def get_profit(self):
-        return sum([bid[1] for bid in self._accepted_bids])
+        return self._matrix.total_price(self._accepted_bids)
+
+    def _winning_bids(self):
+        return list(self._accepted_bids)
 
-    @staticmethod
-    def _has_conflict(target_bid, accepted_bids):
-        """Return true if the bid has items conflicts 
-           with the currently accepted bids.
-        """
-        bid_items = set(target_bid[0])
-        for bid in accepted_bids:
-            if not bid_items.isdisjoint(set(bid[0])):
-                return True
-        return False
+    def _greedy_pass(self, order, deadline=None):
+        """Accept the bids in the given order, see `greedy_pass`."""
+        with self.profile.phase("bundles"):
+            bundles = self._matrix.bundles()
+        with self.profile.phase("pass"):
+            accepted, checked = greedy_pass(
+                bundles, self._matrix.nr_items, order, deadline)
+        self._accepted_bids += accepted
+        self.profile.count("conflict_checks", checked)
 
 
 class GreedyNumberOfItems(GreedyBase):
     def __init__(self, bids, name, logger):
         super(GreedyNumberOfItems, self).__init__(bids, name, logger)
 
-    def _solve(self, timeout=None):
-        all_bids = list(self._bids.values())
-        all_bids.sort(
-            key=lambda x:len(x[0]),
-            reverse=True)
-
-        for bid in all_bids:
-            if self._has_conflict(bid, self._accepted_bids):
-                continue
-            self._accepted_bids.append(bid)
+    def _solve(self, deadline):
+        order = np.argsort(-self._matrix.sizes, kind='stable')
+        self._greedy_pass(order, deadline)
 
 
 class GreedyBigBet(GreedyBase):
     def __init__(self, bids, name, logger):
         super(GreedyBigBet, self).__init__(bids, name, logger)
 
-    def _solve(self, timeout=None):
-        all_bids = list(self._bids.values())
-        all_bids.sort(
-            key=lambda x: x[1],
-            reverse=True)
-
-        for bid in all_bids:
-            if self._has_conflict(bid, self._accepted_bids):
-                continue
-            self._accepted_bids.append(bid)
+    def _solve(self, deadline):
+        order = np.argsort(-self._matrix.prices, kind='stable')
+        self._greedy_pass(order, deadline)
 
 
 class GreedyAverageItemsPrice(GreedyBase):
     def __init__(self, bids, name, logger):
         super(GreedyAverageItemsPrice, self).__init__(bids, name, logger)
 
-    def _solve(self, timeout=None):
-        all_bids = list(self._bids.values())
-
-        # compute the average item price
-        enhanced_bids = []
-        for bid in all_bids:
-            enhanced_bids.append(
-                (bid, bid[1]/len(bid[0]))
-            )
-        enhanced_bids.sort(
-            key=lambda x: x[1],
-            reverse=True)
-
-        # we don't care about average item price at this point
-        for bid in [bid[0] for bid in enhanced_bids]:
-            if self._has_conflict(bid, self._accepted_bids):
-                continue
-            self._accepted_bids.append(bid)
+    def _solve(self, deadline):
+        # the average item price is precomputed by the bid matrix
+        order = np.argsort(-self._matrix.price_per_item, kind='stable')
+        self._greedy_pass(order, deadline)
+
+
+def orderings(matrix, random_orderings=0, seed=0):
+    """Return `(name, order)` of every bid ordering of the portfolio.
+
+    The orderings of the greedy solutions and price / sqrt(size) come
+    first, the usually best ones before, then every base ordering again
+    with random tie-breaks.
+    """
+    keys = [
+        ('price_per_item', matrix.price_per_item),
+        ('price_per_sqrt_size',
+         matrix.prices / np.sqrt(np.maximum(matrix.sizes, 1))),
+        ('prices', matrix.prices),
+        ('sizes', matrix.sizes),
+    ]
+    result = [(name, np.argsort(-key, kind='stable')) for name, key in keys]
+    random_state = np.random.RandomState(seed)
+    for index in range(random_orderings):
+        name, key = keys[index % len(keys)]
+        ties = random_state.random_sample(matrix.nr_bids)
+        result.append(('{}_random{}'.format(name, index),
+                       np.lexsort((ties, -key))))
+    return result
+
+
+_worker_matrix = None
+_worker_bundles = None
+
+
+def _init_worker(matrix):
+    global _worker_matrix, _worker_bundles
+    _worker_matrix = matrix
+    _worker_bundles = matrix.bundles()
+
+
+def _run_orderings(orders, timeout, cpu_timeout):
+    """Run the greedy passes of some orderings in a worker, return them
+    and the CPU time used.
+    """
+    budget = deadline.Deadline(timeout, cpu_timeout)
+    passes = [greedy_pass(_worker_bundles, _worker_matrix.nr_items, order,
+                          budget)
+              for order in orders]
+    return passes, budget.cpu_elapsed()
+
+
+class GreedyPortfolio(GreedyBase):
+    """Run the greedy pass over many bid orderings and keep the best.
+
+    The orderings are split between `jobs` worker processes, each one gets
+    the bid matrix once. The portfolio holds the orderings of the other
+    greedy solutions, so it is never worse than any of them.
+    """
+
+    def __init__(self, bids, name, logger, random_orderings=4, seed=0,
+                 jobs=None):
+        super(GreedyPortfolio, self).__init__(bids, name, logger)
+        self._random_orderings = random_orderings
+        self._seed = seed
+        self._jobs = jobs or os.cpu_count() or 1
+        self.profits = {}
+        self.best_ordering = None
+
+    def _extra_summary(self):
+        self._logger.info("Best ordering     => %s", self.best_ordering)
+
+    def get_summary(self, file_path):
+        summary = super(GreedyPortfolio, self).get_summary(file_path)
+        summary["best_ordering"] = self.best_ordering
+        summary["orderings"] = dict(self.profits)
+        return summary
+
+    def _passes(self, orders, deadline):
+        """Return the accepted bids and checked bids of every order."""
+        jobs = min(self._jobs, len(orders))
+        if jobs == 1 or self._matrix.nr_bids < MIN_PARALLEL_BIDS:
+            bundles = self._matrix.bundles()
+            return [greedy_pass(bundles, self._matrix.nr_items, order,
+                                deadline)
+                    for order in orders]
+        # the workers get the seconds left, the deadline stays here
+        timeout, cpu_timeout = deadline.worker_budget(1.0 / jobs)
+        with concurrent.futures.ProcessPoolExecutor(
+                jobs, initializer=_init_worker,
+                initargs=(self._matrix,)) as executor:
+            futures = [executor.submit(_run_orderings, orders[job::jobs],
+                                       timeout, cpu_timeout)
+                       for job in range(jobs)]
+            batches = []
+            for future in futures:
+                batch, cpu_time = future.result()
+                deadline.charge(cpu_time)
+                batches.append(batch)
+        # back to the order of the orderings
+        passes = [None] * len(orders)
+        for job, batch in enumerate(batches):
+            passes[job::jobs] = batch
+        return passes
+
+    def _solve(self, deadline):
+        with self.profile.phase("orderings"):
+            named_orders = orderings(self._matrix, self._random_orderings,
+                                     self._seed)
+        with self.profile.phase("passes"):
+            passes = self._passes([order for _, order in named_orders],
+                                  deadline)
+        self.profits = {}
+        best_profit = None
+        for (name, _), (accepted, checked) in zip(named_orders, passes):
+            profit = self._matrix.total_price(accepted)
+            self.profits[name] = profit
+            self.profile.count("conflict_checks", checked)
+            # the first ordering wins the ties
+            if best_profit is None or profit > best_profit:
+                best_profit = profit
+                self.best_ordering = name
+                self._accepted_bids = accepted
+        self.profile.count("orderings", len(named_orders))
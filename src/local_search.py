@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Local search improvement phase.
+
+Starting from the winning bids of any solution, a move inserts a bid,
+evicts the winning bids it conflicts with and refills the freed items
+with the best free neighbours of the evicted bids. The move is kept only
+if the profit goes up. The owner of every item and the profit are
+updated incrementally, rejected moves are rolled back.
+"""
+import numpy as np
+
+import base_solution
+import greedy_model
+
+
+class LocalSearch(object):
+    """Insert / evict local search over a set of winning bids."""
+
+    def __init__(self, matrix, graph, max_evictions=None):
+        self._matrix = matrix
+        self._graph = graph
+        self._max_evictions = max_evictions
+        self._bundles = matrix.bundles()
+        self._incidence = matrix.incidence()
+        self._prices = matrix.prices.tolist()
+        self._price_per_item = matrix.price_per_item
+
+        # winning bid holding every item, -1 if the item is free
+        self._owner = np.full(matrix.nr_items, -1, dtype=np.int64)
+        self._selected = np.zeros(matrix.nr_bids, dtype=bool)
+        self.profit = 0.0
+        self.moves = 0
+        self.tried = 0
+
+        # candidates are tried with the best average item price first
+        self._order = np.argsort(-matrix.price_per_item, kind='stable')
+
+    def load(self, bids):
+        """Start from a feasible set of winning bids."""
+        self._owner[:] = -1
+        self._selected[:] = False
+        self.profit = 0.0
+        for bid in bids:
+            self._insert(bid)
+
+    def winning_bids(self):
+        return np.flatnonzero(self._selected).tolist()
+
+    def _insert(self, bid):
+        self._owner[self._bundles[bid]] = bid
+        self._selected[bid] = True
+        self.profit += self._prices[bid]
+
+    def _evict(self, bid):
+        self._owner[self._bundles[bid]] = -1
+        self._selected[bid] = False
+        self.profit -= self._prices[bid]
+
+    def _is_free(self, bid):
+        return not (self._owner[self._bundles[bid]] >= 0).any()
+
+    def _conflicts(self, bid):
+        owners = self._owner[self._bundles[bid]]
+        return np.unique(owners[owners >= 0])
+
+    def _try_move(self, bid):
+        """Apply the move of `bid`, return true if it was kept."""
+        evicted = self._conflicts(bid).tolist()
+        if not evicted:
+            self._insert(bid)
+            return True
+        if self._max_evictions and len(evicted) > self._max_evictions:
+            return False
+
+        profit = self.profit
+        for other in evicted:
+            self._evict(other)
+        self._insert(bid)
+        inserted = [bid]
+
+        # refill the items freed by the evicted bids
+        candidates = np.unique(np.concatenate(
+            [self._graph.neighbors(other) for other in evicted]))
+        candidates = candidates[~self._selected[candidates]]
+        occupied = self._owner >= 0
+        candidates = candidates[self._incidence[candidates] @ occupied == 0]
+        candidates = candidates[
+            np.argsort(-self._price_per_item[candidates], kind='stable')]
+        for other in candidates.tolist():
+            if self._is_free(other):
+                self._insert(other)
+                inserted.append(other)
+
+        if self.profit > profit + 1e-9:
+            return True
+
+        # roll back
+        for other in reversed(inserted):
+            self._evict(other)
+        for other in evicted:
+            self._insert(other)
+        self.profit = profit
+        return False
+
+    def improve(self, deadline=None, callback=None):
+        """Apply improving moves until none is left or the deadline.
+
+        `callback(profit)` is called after every improving move, the
+        search stops if it returns a true value.
+        """
+        improved = True
+        while improved:
+            improved = False
+            for bid in self._order.tolist():
+                if deadline is not None and deadline.expired():
+                    return
+                if self._selected[bid]:
+                    continue
+                self.tried += 1
+                if self._try_move(bid):
+                    self.moves += 1
+                    improved = True
+                    if callback is not None and callback(self.profit):
+                        return
+
+
+class LocalSearchSolution(base_solution.BaseSolution):
+    """Run a solution and improve its winning bids with local search.
+
+    The start solution gets `start_share` of the time left, the local
+    search the rest.
+    """
+    DETERMINISTIC = True
+
+    def __init__(self, bids, name, logger,
+                 start_cls=greedy_model.GreedyAverageItemsPrice,
+                 start_share=0.5, max_evictions=None):
+        super(LocalSearchSolution, self).__init__(bids, name, logger)
+        self._start = start_cls(self._matrix, name, logger)
+        self._start_share = start_share
+        self._search = LocalSearch(
+            self._matrix, self.conflict_graph, max_evictions)
+        self._start_profit = 0.0
+
+    def _get_status(self):
+        return "Solved"
+
+    def _winning_bids(self):
+        return self._search.winning_bids()
+
+    def get_profit(self):
+        return self._matrix.total_price(self._winning_bids())
+
+    def _extra_summary(self):
+        self._logger.info("Start profit      => %s", self._start_profit)
+        self._logger.info("Improving moves   => %s", self._search.moves)
+
+    def _solve(self, deadline):
+        with self.profile.phase("start"):
+            self._start.solve(timeout=deadline.split(self._start_share))
+            self._search.load(self._start.winning_bids())
+        self._start_profit = self._search.profit
+        self._report_incumbent(self._start_profit)
+
+        with self.profile.phase("search"):
+            self._search.improve(deadline, self._on_improve)
+        self.profile.count("moves_tried", self._search.tried)
+        self.profile.count("moves_kept", self._search.moves)
+
+    def _on_improve(self, profit):
+        self._report_incumbent(profit)
+        return self._stop_requested
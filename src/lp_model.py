@@ -3,24 +3,140 @@
 import os
 import datetime
 import logging
+import subprocess
+import tempfile
 import time
 
 
+import numpy as np
 import pulp
 
 import base_solution
+import greedy_model
 
 
+# how many terms are written on one line of the LP file
+TERMS_PER_LINE = 8
+
+# GLPK solution status letters mapped to the PuLP status codes, a feasible
+# solution was found before the time limit but not proved optimal
+GLPK_STATUS = {
+    'o': pulp.LpStatusOptimal,
+    'f': pulp.LpStatusNotSolved,
+    'n': pulp.LpStatusInfeasible,
+    'u': pulp.LpStatusUndefined,
+}
+
+
+def _write_terms(fd, terms):
+    for start in range(0, len(terms), TERMS_PER_LINE):
+        prefix = " + " if start else " "
+        fd.write(prefix + " + ".join(terms[start:start + TERMS_PER_LINE]) + "\n")
+
+
+def write_lp(matrix, path, name, cutoff=None):
+    """Write the auction model in CPLEX LP format straight from the
+    bid matrix, one constraint per item of the inverted index.
+
+    With a cutoff only solutions with at least that profit are feasible.
+    """
+    item_offsets, item_bids = matrix.item_index()
+    with open(path, "w") as fd:
+        fd.write("\\* {} *\\\n".format(name))
+        fd.write("Maximize\nOBJ:\n")
+        _write_terms(fd, ["{!r} bid_{}".format(price, index)
+                          for index, price in enumerate(matrix.prices.tolist())])
+
+        fd.write("Subject To\n")
+        for item in range(matrix.nr_items):
+            bids = item_bids[item_offsets[item]:item_offsets[item + 1]]
+            fd.write("max_one_pick_{}:\n".format(item))
+            _write_terms(fd, ["bid_{}".format(bid) for bid in bids.tolist()])
+            fd.write(" <= 1\n")
+        if cutoff is not None:
+            fd.write("incumbent_cutoff:\n")
+            _write_terms(fd, ["{!r} bid_{}".format(price, index)
+                              for index, price in enumerate(matrix.prices.tolist())])
+            fd.write(" >= {!r}\n".format(cutoff))
+
+        fd.write("Binaries\n")
+        for start in range(0, matrix.nr_bids, TERMS_PER_LINE):
+            stop = min(start + TERMS_PER_LINE, matrix.nr_bids)
+            fd.write(" " + " ".join(
+                "bid_{}".format(index) for index in range(start, stop)) + "\n")
+        fd.write("End\n")
+
+
+def write_mps(matrix, path, name):
+    """Write the auction model in fixed MPS format straight from the
+    bid matrix. MPS is column oriented, so every column is one bundle.
+
+    The objective is negated because MPS models are minimized.
+    """
+    with open(path, "w") as fd:
+        fd.write("NAME          {}\n".format(name.replace(" ", "_")))
+        fd.write("ROWS\n N  OBJ\n")
+        for item in range(matrix.nr_items):
+            fd.write(" L  C{}\n".format(item))
+
+        fd.write("COLUMNS\n")
+        fd.write("    MARKER                 'MARKER'                 'INTORG'\n")
+        prices = matrix.prices.tolist()
+        for index, bundle in enumerate(matrix.bundles()):
+            column = "X{}".format(index)
+            fd.write("    {:<8}  OBJ       {!r}\n".format(column, -prices[index]))
+            for item in bundle.tolist():
+                fd.write("    {:<8}  C{:<8} 1\n".format(column, item))
+        fd.write("    MARKER                 'MARKER'                 'INTEND'\n")
+
+        fd.write("RHS\n")
+        for item in range(matrix.nr_items):
+            fd.write("    RHS       C{:<8} 1\n".format(item))
+
+        fd.write("BOUNDS\n")
+        for index in range(matrix.nr_bids):
+            fd.write(" BV BND       X{}\n".format(index))
+        fd.write("ENDATA\n")
+
+
+def read_glpk_solution(path, nr_bids):
+    """Read a GLPK `-w` MIP solution, return the PuLP status and the
+    value of every bid.
+    """
+    status = pulp.LpStatusUndefined
+    values = np.zeros(nr_bids)
+    with open(path, "r") as fd:
+        for line in fd:
+            elems = line.split()
+            if not elems:
+                continue
+            if elems[0] == "s":
+                status = GLPK_STATUS.get(elems[4], pulp.LpStatusUndefined)
+            elif elems[0] == "j":
+                values[int(elems[1]) - 1] = float(elems[2])
+    return status, values
+
 
 class LPModel(base_solution.BaseSolution):
-    def __init__(self, bids, name, logger):
+    DETERMINISTIC = True
+
+    def __init__(self, bids, name, logger, direct=False, incumbent=None):
         super(LPModel, self).__init__(bids, name, logger)
-        self._vars = self._prepare_vars()
-        self._model = self._prepare_model()
+        # in direct mode the model files are written from the bid
+        # matrix and PuLP objects are never built
+        self._direct = direct
+        self._values = None
+        self._incumbent = list(incumbent or [])
+        self._winning = []
+        self._vars = None
+        self._model = None
+        if not self._direct:
+            self._vars = self._prepare_vars()
+            self._model = self._prepare_model()
 
     def _prepare_vars(self):
         variables = pulp.LpVariable.dicts(
-            'bid', list(self._bids.keys()),
+            'bid', list(range(self._matrix.nr_bids)),
             lowBound = 0,
             upBound = 1,
             cat = pulp.LpInteger)
@@ -33,59 +149,156 @@ class LPModel(base_solution.BaseSolution):
             pulp.LpMaximize)
 
         # maximize the profit
+        prices = self._matrix.prices.tolist()
         model += pulp.lpSum(
-            [self._bids[index][1] * self._vars[index] for index in self._vars])
+            [prices[index] * self._vars[index] for index in self._vars])
 
         # Add restriction that you can only take
         # one bid if they share at least one item
-        for item in self.all_items():
-            restrictie = sum(
-                [self._vars[index] for (index, data) in self._bids.items()
-                                if item in data[0]]) <= 1, "max_one_pick_%s"%str(item)
+        item_offsets, item_bids = self._matrix.item_index()
+        for item in range(self._matrix.nr_items):
+            bids = item_bids[item_offsets[item]:item_offsets[item + 1]]
+            restrictie = pulp.lpSum(
+                [self._vars[index] for index in bids.tolist()]) <= 1, "max_one_pick_%s"%str(item)
             model  += restrictie
         return model
 
     def _save_model(self, model_name=None):
         if model_name is None:
             model_name = "model_{}".format(datetime.datetime.now())
-        self._logger.debug(self._model)
-
 
         self._logger.info("Saving the model as %s", model_name)
+        if self._direct:
+            write_lp(self._matrix, os.path.join("models", model_name+".lp"),
+                     "Auction Model "+self._name)
+            write_mps(self._matrix, os.path.join("models", model_name+".mps"),
+                      "Auction Model "+self._name)
+            return
+
+        self._logger.debug(self._model)
         self._model.writeLP(os.path.join("models", model_name+".lp"))
         self._model.writeMPS(os.path.join("models", model_name+".mps"))
 
+    def set_incumbent(self, bids):
+        """Start from a feasible set of winning bids, found by a heuristic.
+
+        Only better solutions are searched for and the incumbent is
+        returned if the solver can't beat it in time.
+        """
+        self._incumbent = list(bids)
+
+    def _cutoff(self):
+        """Profit a solution must reach to improve on the incumbent."""
+        if not self._incumbent:
+            return None
+        profit = self._matrix.total_price(self._incumbent)
+        # leave room for rounding, the incumbent itself stays feasible
+        return profit - 1e-6 * max(1.0, abs(profit))
+
+    def _winning_bids(self):
+        return list(self._winning)
+
+    def _lp_winning_bids(self):
+        if self._direct:
+            if self._values is None:
+                return []
+            return np.flatnonzero(self._values == 1.0).tolist()
+        return [index for index in range(self._matrix.nr_bids)
+                if self._vars[index].value() == 1.0]
+
     def get_profit(self):
-        total_profit = 0
-        for index, data in self._bids.items():
-            _, pay = data
-            if self._vars[index].value() == 1.0:
-                total_profit += pay
-        return total_profit
+        return self._matrix.total_price(self._winning_bids())
 
     def _get_status(self):
         return pulp.LpStatus[self._rez]
 
+    def proved_optimal(self):
+        if self._rez == pulp.LpStatusOptimal:
+            # PuLP reports the solutions glpsol found before its time limit
+            # as optimal too, only the direct mode tells them apart
+            return self._direct
+        # no solution beats the cutoff, the incumbent is optimal
+        return (self._cutoff() is not None and
+                self._rez == pulp.LpStatusInfeasible)
+
     def _extra_summary(self):
         self._logger.debug("Winning bids:")
-        for index, data in self._bids.items():
-            items, pay = data
-            if self._vars[index].value() == 1.0:
-                self._logger.debug("[{:5}]{:18} => {}".format(
-                    str(index), str(items), pay))
+        for index in self._winning_bids():
+            self._logger.debug("[{:5}]{:18} => {}".format(
+                str(index), str(self._matrix.bundle_names(index)),
+                self._matrix.prices[index]))
 
-    def _solve(self, timeout=None):
+    def _solve_direct(self, options, cutoff=None):
+        """Write the LP file from the bid matrix and run glpsol on it."""
+        with tempfile.TemporaryDirectory() as directory:
+            lp_path = os.path.join(directory, "model.lp")
+            solution_path = os.path.join(directory, "model.sol")
+            with self.profile.phase("write"):
+                write_lp(self._matrix, lp_path, "Auction Model "+self._name,
+                         cutoff=cutoff)
+            with self.profile.phase("glpsol"):
+                subprocess.check_call(
+                    ["glpsol", "--lp", lp_path, "-w", solution_path] + options,
+                    stdout=subprocess.DEVNULL)
+            with self.profile.phase("read"):
+                status, self._values = read_glpk_solution(
+                    solution_path, self._matrix.nr_bids)
+        return status
+
+    def _solve(self, deadline):
         start_time = time.time()
         # CPLEX will tell us that the problem in infeasible for large datasets
         # self._rez = self._model.solve(pulp.CPLEX())
         # import pdb; pdb.set_trace()
         options = ['--binarize']
-        if timeout:
-            options.extend(["--tmlim", str(timeout)])
+        remaining = deadline.remaining()
+        if remaining is not None:
+            # glpsol only takes whole seconds
+            options.extend(["--tmlim", str(max(int(remaining), 1))])
 
-        solver = pulp.GLPK(options=options)
+        cutoff = self._cutoff()
+        if self._direct:
+            self._rez = self._solve_direct(options, cutoff)
+        else:
+            if "incumbent_cutoff" in self._model.constraints:
+                del self._model.constraints["incumbent_cutoff"]
+            if cutoff is not None:
+                self._model += self._model.objective >= cutoff, "incumbent_cutoff"
+                for index in self._incumbent:
+                    self._vars[index].setInitialValue(1)
+            solver = pulp.GLPK(options=options)
+            # PuLP writes the model, runs glpsol and reads the solution
+            with self.profile.phase("glpsol"):
+                self._rez = self._model.solve(solver)
 
-        self._rez = self._model.solve(solver)
+        self._winning = self._lp_winning_bids()
+        if (self._incumbent and self._matrix.total_price(self._winning) <
+                self._matrix.total_price(self._incumbent)):
+            self._logger.info("Keeping the incumbent, the solver did not "
+                              "improve on it in time")
+            self._winning = list(self._incumbent)
         delta_time = time.time() - start_time
         self._delta_time = delta_time
         return self._rez, self._delta_time
+
+
+class WarmStartLPModel(LPModel):
+    """LP model started from the solution of a fast heuristic.
+
+    The heuristic runs first and its winning bids are the incumbent of
+    the MIP solver, so the result is never worse than the heuristic.
+    """
+
+    def __init__(self, bids, name, logger, direct=False,
+                 start_cls=greedy_model.GreedyAverageItemsPrice):
+        super(WarmStartLPModel, self).__init__(
+            bids, name, logger, direct=direct)
+        self._start_cls = start_cls
+
+    def _solve(self, deadline):
+        start = self._start_cls(self._matrix, self._name, self._logger)
+        with self.profile.phase("start"):
+            start.solve(timeout=deadline)
+        self.set_incumbent(start.winning_bids())
+        self._report_incumbent(start.get_profit())
+        return super(WarmStartLPModel, self)._solve(deadline)
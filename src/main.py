@@ -2,42 +2,43 @@
 import argparse
 import os
 import logging
-import json
 
 import base_solution
+import dataset
+import preprocess
+import profiling
+import result_cache
+import results_store
+import runner
+import tuning
 import lp_model
+import portfolio
+import branch_and_bound
 import greedy_model
 import aoc_model
 import aoc_model_second_generation
+import aoc_island_model
+import local_search
 
 
-def parse_file(file_path):
+def parse_file(file_path, use_cache=True):
     """Parse a file in the appropriate format for the model."""
-    bids = {}
-    with open(file_path, "r") as fd:
-        # skip the first line with the number of items and
-        # number of bids
-        first_line = fd.readline()
-        if first_line.endswith("#"):
-            # index on line 
-            for line in fd:
-                money, *items = line.replace("#", "")[1:].trimp().split()
-                bids[tuple(items)] = float(money)
-        else:
-            # no index on the line
-            for line in fd:
-                money, *items = line.split()
-                bids[tuple(items)] = float(money)
-    return bids
+    return dataset.load(file_path, use_cache=use_cache)
 
 
 SOLUTIONS = [
     lp_model.LPModel,
+    lp_model.WarmStartLPModel,
+    branch_and_bound.BranchAndBound,
     greedy_model.GreedyNumberOfItems,
     greedy_model.GreedyBigBet,
     greedy_model.GreedyAverageItemsPrice,
+    greedy_model.GreedyPortfolio,
     aoc_model.AOCBaseSolution,
     aoc_model_second_generation.AOCBaseSolutionSecondGeneration,
+    aoc_island_model.AOCIslandModel,
+    local_search.LocalSearchSolution,
+    portfolio.RacingPortfolio,
 ]
 
 ALL_SOLUTIONS = 'ALL'
@@ -48,7 +49,7 @@ def get_parser():
     parser = argparse.ArgumentParser(
             description='Tool for analyzing combinatorial auction solutions.')
     parser.add_argument('--summary-dir', default='summary_dir', type=str,
-                        help='Directory for storing summary files.')
+                        help='Directory for storing the results store.')
     parser.add_argument('-s', '--solutions',  type=str, required=True,
                         action='append', choices=SOLUTION_CHOICES)
 
@@ -59,12 +60,58 @@ def get_parser():
                         choices=['INFO', 'DEBUG'],
                         help='Logging level.')
 
-    parser.add_argument('-t', '--timeout',  type=int, default=None,
-                        help='Nanoseconds to wait for a solution')
+    parser.add_argument('-t', '--timeout',  type=float, default=None,
+                        help='Seconds of wall clock time to wait for a '
+                             'solution.')
+
+    parser.add_argument('--cpu-timeout',  type=float, default=None,
+                        help='Seconds of CPU time to wait for a solution.')
+
+    parser.add_argument('--reserve',  type=float, default=0.0,
+                        help='Seconds before the timeout reserved for '
+                             'extracting the best solution.')
 
     parser.add_argument('-r', '--run-times',  type=int, default=1,
                         help='Times to run each solution.')
 
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not use the binary cache of the datasets.')
+
+    parser.add_argument('--decompose', action='store_true',
+                        help='Prune dominated bids and solve every connected '
+                             'component of the auction separately.')
+
+    parser.add_argument('-j', '--jobs',  type=int, default=1,
+                        help='Worker processes, each run is isolated in its '
+                             'own process when more than one (0 for one per '
+                             'core).')
+
+    parser.add_argument('--task-timeout',  type=int, default=None,
+                        help='Seconds after which a worker is killed and '
+                             'its run recorded as a failure.')
+
+    parser.add_argument('--profile-dir',  type=str, default=None,
+                        help='Dump the cProfile stats of every run in this '
+                             'directory.')
+
+    parser.add_argument('--result-cache',  type=str,
+                        default=result_cache.CACHE_DIR,
+                        help='Directory of the cached run results.')
+
+    parser.add_argument('--no-result-cache', action='store_true',
+                        help='Run every solution, without reading or saving '
+                             'cached results.')
+
+    parser.add_argument('--reuse',  type=str, default='runs',
+                        choices=result_cache.REUSE_POLICIES,
+                        help='When cached runs are reused: every repetition '
+                             '(runs), only for deterministic solutions or '
+                             'never.')
+
+    parser.add_argument('--solver-params',  type=str, default=None,
+                        help='JSON file of the tuned solver parameters of '
+                             'every dataset family, saved by tuning.py.')
+
     return parser
 
 def get_datasets(directory):
@@ -73,28 +120,14 @@ def get_datasets(directory):
     for root, dirs, files in os.walk(os.path.abspath(directory), topdown=False):
         for name in files:
             file_path = os.path.join(os.path.abspath(root), name)
+            if dataset.is_cache(file_path):
+                continue
             size = os.stat(file_path).st_size
             datasets.append((name, file_path, size))
 
     datasets.sort(key=lambda x: x[2])
     return datasets
 
-def save_summary(summary, summary_path):
-    full_summary_path = os.path.abspath(summary_path)
-    if not os.path.isfile(full_summary_path):
-        with open(full_summary_path, "w+") as fd:
-            fd.write('{}')
-
-    with open(full_summary_path, "r+") as fp:
-        data = json.load(fp)
-    if "models" not in data:
-        data["models"] = []
-
-    data["models"].append(summary)
-    with open(full_summary_path, "w") as fp:
-        json.dump(data, fp)
-
-
 def get_solutions(solution_names):
     """
     Return a list of solutions.
@@ -130,32 +163,88 @@ def main():
     if not os.path.isdir(summary_dir):
         raise Exception('{} is not a directory'.format(summary_dir))
 
+    store_path = os.path.join(summary_dir, results_store.STORE_NAME)
+    cache = None
+    if not args.no_result_cache:
+        cache = result_cache.ResultCache(args.result_cache, args.reuse)
+    solver_params = None
+    if args.solver_params:
+        solver_params = tuning.load(args.solver_params)
+    if args.jobs != 1:
+        tasks = runner.get_tasks(datasets, solutions, args.run_times,
+                                 solver_params)
+        runner.run(tasks, store_path, logger,
+                   jobs=args.jobs, timeout=args.timeout,
+                   cpu_timeout=args.cpu_timeout, reserve=args.reserve,
+                   task_timeout=args.task_timeout,
+                   use_cache=not args.no_cache,
+                   logging_lvl=args.logging_lvl,
+                   decompose=args.decompose,
+                   profile_dir=args.profile_dir,
+                   cache=cache)
+        return
+
     total_runs = len(datasets)*len(solutions)*args.run_times
     current_run = 0 
 
+    budget = (args.timeout, args.cpu_timeout, args.reserve)
+    store = results_store.ResultsStore(store_path)
     for name, file_path, _ in datasets:
         logger.info('%s%s  %s  %s', '\n'*8, '-'*60, name, '-'*60)
+        # parsed on the first run that is not cached
+        bids = None
         for solutionc_cls in solutions:
-            file_name = '{}_summary.json'.format(solutionc_cls.__name__)
-            output_file = os.path.join(summary_dir, file_name) 
             logger.info(
                 '%s%s%s  %s  %s%s', '\n'*2, ' '*40,
                 '+'*20, solutionc_cls.__name__, '+'*20, ' '*40)
+            params = tuning.params_for(solver_params, solutionc_cls,
+                                       file_path)
 
             for itteration in range(args.run_times):
                 current_run += 1
                 logger.info("%s[%s][total_runs=%s/%s]Started work on %s ... %s",
                             '\n'*4, itteration, total_runs, current_run,
                             name, '\n'*4)
-                bids = parse_file(file_path)
+                key = None
+                if cache is not None:
+                    key, summary = cache.lookup(
+                        file_path, solutionc_cls, budget, itteration,
+                        decompose=args.decompose, params=params)
+                    if summary is not None:
+                        logger.info("Reusing the cached run %s", key)
+                        store.append(summary)
+                        continue
+                run_profile = profiling.Profile()
+                if bids is None:
+                    with run_profile.phase("parse"):
+                        bids = parse_file(file_path,
+                                          use_cache=not args.no_cache)
+                else:
+                    # parsed by an earlier run of the dataset
+                    run_profile.count("parse_cached")
                 logger.info("Creating model %s ...", name)
-                auction_model = solutionc_cls(bids, "model_"+name, logger)
+                with run_profile.phase("build"):
+                    auction_model = preprocess.create_model(
+                        solutionc_cls, bids, "model_"+name, logger,
+                        decompose=args.decompose, params=params)
+                auction_model.profile.update(run_profile)
                 logger.info("Solving %s ...", name)
-                auction_model.solve(timeout=args.timeout)
+                with profiling.cprofile(profiling.cprofile_path(
+                        args.profile_dir, solutionc_cls.__name__, file_path,
+                        itteration)):
+                    auction_model.solve(timeout=args.timeout,
+                                        cpu_timeout=args.cpu_timeout,
+                                        reserve=args.reserve)
                 auction_model.summary()
                 summary = auction_model.get_summary(file_path)
                 summary['timeout'] = args.timeout
-                save_summary(summary, output_file)
+                summary['run'] = itteration
+                if params:
+                    summary['params'] = params
+                store.append(summary)
+                if cache is not None:
+                    cache.put(key, summary, auction_model.winning_bids())
+    store.close()
 
 
 if __name__ == '__main__':
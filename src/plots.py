@@ -1,34 +1,33 @@
 #!/usr/bin/env python3
-import os
-import json
-from statistics import median, mean
+import argparse
 
-from matplotlib.ticker import FuncFormatter
 import matplotlib.pyplot as plt
 import numpy as np
 
-import base_solution
+import analysis
+import results_store
 import lp_model
+import branch_and_bound
 import greedy_model
 import aoc_model
 import aoc_model_second_generation
-
-SOLUTIONS = [
-    lp_model.LPModel,
-    greedy_model.GreedyNumberOfItems,
-    greedy_model.GreedyBigBet,
-    greedy_model.GreedyAverageItemsPrice,
-    aoc_model.AOCBaseSolution,
-    aoc_model_second_generation.AOCBaseSolutionSecondGeneration,
-]
+import aoc_island_model
+import local_search
+import portfolio
 
 SOLUTIONS_TO_SHORT_NAMES = {
     lp_model.LPModel.__name__: 'lp',
+    lp_model.WarmStartLPModel.__name__: 'lp_ws',
+    branch_and_bound.BranchAndBound.__name__: 'bnb',
     greedy_model.GreedyNumberOfItems.__name__: 'g_items',
     greedy_model.GreedyBigBet.__name__: 'g_big',
     greedy_model.GreedyAverageItemsPrice.__name__: 'g_avg',
+    greedy_model.GreedyPortfolio.__name__: 'g_port',
     aoc_model.AOCBaseSolution.__name__: 'aco',
     aoc_model_second_generation.AOCBaseSolutionSecondGeneration.__name__: 'aco_s',
+    aoc_island_model.AOCIslandModel.__name__: 'aco_i',
+    local_search.LocalSearchSolution.__name__: 'ls',
+    portfolio.RacingPortfolio.__name__: 'race',
 }
 
 
@@ -38,6 +37,8 @@ def autolabel(rects, axes, convert=True):
     """
     for rect in rects:
         height = rect.get_height()
+        if np.isnan(height):
+            continue
         text = '%.1f' % float(height)
         if convert:
             text = '%dK' % (int(height) / 1000)
@@ -46,216 +47,171 @@ def autolabel(rects, axes, convert=True):
             text, ha='center', va='bottom')
 
 
-def get_data(path):
-    with open(path, 'r') as fd:
-        return json.loads(fd.read())
-
-
-def get_directory_data(directory_path):
-    models = []
-    # for file_name in os.listdir(directory_path):
-    #     file_path = os.path.join(directory_path, file_name)
-    #     if not os.path.isfile(file_path):
-    #         continue
-
-
-    for root, dirs, files in os.walk(os.path.abspath(directory_path), topdown=False):
-        for name in files:
-            if name == '.DS_Store':
-                continue
-            file_path = os.path.join(os.path.abspath(root), name)
-            data = get_data(file_path)
-            models += data['models']
-
-    return models
-
+def trajectory_curves(models, grid):
+    """Return the mean profit over time of every solver, every run is
+    normalized by the best profit found on its dataset.
+    """
+    best_profit = {}
+    for model in models:
+        if model.get('trajectory'):
+            best_profit[model['file_path']] = max(
+                best_profit.get(model['file_path'], 0), model['profit'])
 
-def main():
-    # histogram price
-    lp_1_min = get_data('../data/results/1_minute_time_out_full_run_binary_operation.json')
-    lp_5_min = get_data('../data/results/5_minute_time_out_full_run_binary_operation.json')
-    gready_avg = get_data('../data/results/GreedyAverageItemsPrice_full_run.json')
-    gready_items = get_data('../data/results/GreedyNumberOfItems_full_run.json')
-    gready_bid = get_data('../data/results/GreedyBigBet_full_run.json')
-    aoc_first_implementaion_5sec = get_data('../data/results/aoc_firs_implementation_5sec.josn')
-    aoc_second_implementaion_5sec = get_data('../data/results/aoc_second_5_seconds.json')
-
-    datasets = {
-        'lp_1m': lp_1_min,
-        'lp_5m': lp_5_min,
-        'g_avg': gready_avg,
-        'g_items': gready_items,
-        'g_bid': gready_bid,
-        'aco': aoc_first_implementaion_5sec,
-        'aco_s': aoc_second_implementaion_5sec
-    }
-
-    data_array = np.arange(len(datasets))
-    datapoints = []
-    label = []
-    for key, data in datasets.items():
-        label.append(key)
-        total_profit = 0
-        for model in data['models']:
-            total_profit += model['profit']
-        datapoints.append(total_profit)
-
-    t_data_array = np.arange(len(datasets))
-    t_datapoints = []
-    for key, data in datasets.items():
-        total_time = 0
-        for model in data['models']:
-            total_time += model['delta_time']
-        t_datapoints.append(total_time)
-
-    grid = plt.GridSpec(4, 4, wspace=0.4, hspace=0.3, top=0.92, left=0.03, right=0.97, bottom=0.05)
-
-    axes = plt.subplot(grid[0, 0:2])
-    plt.gca().set_title('Total price(full)', pad=20)
-    rect = plt.bar(data_array, datapoints)
-    axes.set_xticklabels([None] + label)
-    autolabel(rect, axes)
-
-    axes = plt.subplot(grid[0, 2:])
-    plt.gca().set_title('Histogram compute time', pad=20)
-    rect = plt.bar(t_data_array, t_datapoints)
-    axes.set_xticklabels([None] + label)
-    autolabel(rect, axes, False)
-
-    # get all summary for a specific type
-    models = get_directory_data('../data/results/5_min_custom_datasets_all_retry_1')
-    # models = get_directory_data('../data/results/10_sec_groupe1_dataset_on_all_solutions_1_retry')
-    # models = get_directory_data('1_min_groupe1_dataset_on_all_solutions_5_retry/')
-    # models = get_directory_data('10_sec_groupe1_dataset_on_all_solutions_1_retry')
-    # models = get_directory_data('5_min_custom_datasets_all_retry_1')
-    split_models = {sol.__name__: [] for sol in SOLUTIONS}
-
-    # import pdb; pdb.set_trace()
+    curves = {}
     for model in models:
-        if 'solver' not in model:
+        trajectory = model.get('trajectory')
+        if not trajectory or not best_profit[model['file_path']]:
             continue
-        if model['solver'] not in split_models:
-            split_models[model['solver']] = []
-        split_models[model['solver']].append(model)
-
-    # plot dataset
-
-    axes = plt.subplot(grid[3, 3])
-    plt.gca().set_title('Sample dataset distribution')
-    plt.plot(
-        [model['nr_items'] for model in models],
-        [model['nr_orders'] for model in models],
-        '+'
-        )
-    plt.xlabel('nr_items')
-    plt.ylabel('nr_orders')
-
-    # mean price and median price
-    width = 0.35
-    labels = []
-    mean_data = []
-    median_data = []
-    for model_name, models in split_models.items():
-        labels.append(model_name)
-        mean_data.append(mean([model['profit'] for model in models]))
-        median_data.append(median([model['profit'] for model in models]))
-    x = np.arange(len(labels))
+        times, profits = np.array(trajectory, dtype=float).T
+        positions = np.searchsorted(times, grid, side='right') - 1
+        values = np.where(positions >= 0, profits[np.maximum(positions, 0)], 0)
+        curves.setdefault(model['solver'], []).append(
+            values / best_profit[model['file_path']])
+    return {solver: np.mean(values, axis=0)
+            for solver, values in curves.items()}
 
 
-    axes = plt.subplot(grid[1, 0:2])
-    plt.gca().set_title('Mean and median')
-    rect1 = plt.bar(x - width/2, mean_data, width, label='mean')
-    rect2 = plt.bar(x + width/2, median_data, width, label='median')
-    axes.set_xticklabels([None] + [SOLUTIONS_TO_SHORT_NAMES[l] for l in labels])
-    plt.legend()
-    autolabel(rect1, axes)
-    autolabel(rect2, axes)
-
-    # min and max
-    width = 0.35
+def _group_labels(stats):
     labels = []
-    min_data = []
-    max_data= []
-    for model_name, models in split_models.items():
-        labels.append(model_name)
-        min_data.append(min([model['profit'] for model in models])) 
-        max_data.append(max([model['profit'] for model in models])) 
-    x = np.arange(len(labels)) 
-
-
-    axes = plt.subplot(grid[2, 0:2])
-    plt.gca().set_title('Min and Max')
-    rect1 = plt.bar(x - width/2, min_data, width, label='min')
-    rect2 = plt.bar(x + width/2, max_data, width, label='max')
-    axes.set_xticklabels([None] + [SOLUTIONS_TO_SHORT_NAMES[l] for l in labels])
-    plt.legend()
-    autolabel(rect1, axes)
-    autolabel(rect2, axes)
-
-    # total_profit_for_sample dataset
-    width = 0.35
-    labels = []
-    total_profit_data = []
-    for model_name, models in split_models.items():
-        labels.append(model_name)
-        total_profit_data.append(sum([model['profit'] for model in models]))
+    for key in stats.index:
+        if not isinstance(key, tuple):
+            key = (key,)
+        parts = []
+        for part in key:
+            if isinstance(part, float):
+                part = 'no_timeout' if np.isnan(part) else '%gs' % part
+            parts.append(str(SOLUTIONS_TO_SHORT_NAMES.get(part, part)))
+        labels.append('/'.join(parts))
+    return labels
+
+
+def _bars(axes, labels, columns, convert=True):
+    """Draw side by side bars for every column of the statistics."""
     x = np.arange(len(labels))
-
-    axes = plt.subplot(grid[2, 2:])
-
-    plt.gca().set_title('Total Profit on sample')
-    rect = plt.bar(x, total_profit_data, width, label='total_profit')
-    axes.set_xticklabels([None] + [SOLUTIONS_TO_SHORT_NAMES[l] for l in labels])
+    width = 0.8 / len(columns)
+    for index, (name, values) in enumerate(columns):
+        offset = (index - (len(columns) - 1) / 2) * width
+        rect = axes.bar(x + offset, values, width, label=name)
+        autolabel(rect, axes, convert)
+    axes.set_xticks(x)
+    axes.set_xticklabels(labels, rotation=30, ha='right')
+    if len(columns) > 1:
+        axes.legend()
+
+
+def plot_report(table, stats):
+    """Plot the statistics of every group and the dataset distribution."""
+    labels = _group_labels(stats)
+    figure = plt.figure(figsize=(18, 14))
+    grid = plt.GridSpec(3, 4, wspace=0.4, hspace=0.6, top=0.95, left=0.05,
+                        right=0.97, bottom=0.08)
+
+    axes = figure.add_subplot(grid[0, 0:2])
+    axes.set_title('Total profit')
+    _bars(axes, labels, [('total', stats['profit_total'])])
+
+    axes = figure.add_subplot(grid[0, 2:])
+    axes.set_title('Total compute time')
+    _bars(axes, labels, [('total', stats['time_total'])], False)
+
+    axes = figure.add_subplot(grid[1, 0:2])
+    axes.set_title('Mean and median')
+    _bars(axes, labels, [('mean', stats['profit_mean']),
+                         ('median', stats['profit_median'])])
+
+    axes = figure.add_subplot(grid[1, 2:])
+    axes.set_title('Min and Max')
+    _bars(axes, labels, [('min', stats['profit_min']),
+                         ('max', stats['profit_max'])])
+
+    axes = figure.add_subplot(grid[2, 0:3])
+    axes.set_title('Runtime percentile')
+    _bars(axes, labels,
+          [('p%d' % percentile, stats['time_p%d' % percentile])
+           for percentile in reversed(analysis.PERCENTILES)], False)
+
+    axes = figure.add_subplot(grid[2, 3])
+    axes.set_title('Sample dataset distribution')
+    axes.plot(table['nr_items'].astype(float),
+              table['nr_orders'].astype(float), '+')
+    axes.set_xlabel('nr_items')
+    axes.set_ylabel('nr_orders')
+    return figure
+
+
+def _finish(output, show):
+    if output:
+        plt.savefig(output)
+        print('Saved {}'.format(output))
+    if show:
+        plt.show()
+    plt.close('all')
+
+
+def plot_trajectories(models, points=500):
+    """Plot the profit against time for every solver."""
+    models = [model for model in models if model.get('trajectory')]
+    if not models:
+        print('No run has a trajectory')
+        return
+    max_time = max(model['delta_time'] for model in models)
+    grid = np.linspace(0, max_time, points)
+
+    plt.figure(figsize=(12, 8))
+    plt.gca().set_title('Profit over time')
+    for solver, curve in sorted(trajectory_curves(models, grid).items()):
+        plt.step(grid, curve, where='post',
+                 label=SOLUTIONS_TO_SHORT_NAMES.get(solver, solver))
+    plt.xlabel('seconds')
+    plt.ylabel('profit / best profit on the dataset')
     plt.legend()
-    autolabel(rect, axes)
 
-    # percentile runtime
-    width = 0.35
-    labels = []
-    percentile_99 = []
-    percentile_95 = []
-    percentile_90 = []
-    percentile_80 = []
-    for model_name, models in split_models.items():
-        labels.append(model_name)
-        percentile_99.append(
-            np.percentile([model['delta_time'] for model in models], 99))
-        percentile_95.append(
-            np.percentile([model['delta_time'] for model in models], 95))
-        percentile_90.append(
-            np.percentile([model['delta_time'] for model in models], 90))
-        percentile_80.append(
-            np.percentile([model['delta_time'] for model in models], 80))
-    x = np.arange(len(labels))
-
-    axes = plt.subplot(grid[3, 0:3])
-    width = 0.65
-    plt.gca().set_title('Runtime percentile')
-    rect1 = plt.bar(x - 2*width/4, percentile_99, width/4, label='p99')
-    rect2 = plt.bar(x - 1*width/4, percentile_95, width/4, label='p95')
-    rect3 = plt.bar(x , percentile_90, width/4, label='p90')
-    rect4 = plt.bar(x + 1*width/4, percentile_80, width/4, label='p80')
-    axes.set_xticklabels([None] + [SOLUTIONS_TO_SHORT_NAMES[l] for l in labels])
-    plt.legend()
-    autolabel(rect1, axes, False)
-    autolabel(rect2, axes, False)
-    autolabel(rect3, axes, False)
-    autolabel(rect4, axes, False)
 
-    # Total compute time
-    compute_time = []
-    labels = []
-    for model_name, models in split_models.items():
-        labels.append(model_name)
-        compute_time.append(sum([model['delta_time'] for model in models]))
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Compare the results of the experiments.')
+    parser.add_argument('sources', type=str, nargs='*',
+                        default=['../data/results'],
+                        help='Results stores, JSON summaries or directories '
+                             'of JSON summaries.')
+    parser.add_argument('--by', type=str, nargs='+', default=['solver'],
+                        choices=['experiment', 'solver', 'family', 'timeout'],
+                        help='Columns the runs are grouped by.')
+    parser.add_argument('-o', '--output', type=str, default='plots.png',
+                        help='Figure file, the format follows the '
+                             'extension.')
+    parser.add_argument('--show', action='store_true',
+                        help='Also open the figure in a window.')
+    parser.add_argument('--cache-dir', type=str, default=analysis.CACHE_DIR,
+                        help='Cache of the loaded sources.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Load every source from scratch.')
+    parser.add_argument('--trajectory', type=str, default=None,
+                        help='Plot profit over time for the runs of a '
+                             'results store or JSON summary.')
+    return parser
 
-    axes = plt.subplot(grid[1, 2:])
-    plt.gca().set_title('Histogram compute time (sample)', pad=20)
-    rect = plt.bar(x, compute_time)
-    axes.set_xticklabels([None] + [SOLUTIONS_TO_SHORT_NAMES[l] for l in labels])
-    autolabel(rect, axes, False)
 
-    plt.show()
+def main():
+    args = get_parser().parse_args()
+    if not args.show:
+        # render to files only, no display is needed
+        plt.switch_backend('Agg')
+
+    if args.trajectory:
+        plot_trajectories(results_store.load_models(args.trajectory))
+        _finish(args.output, args.show)
+        return
+
+    table = analysis.load_table(
+        args.sources, cache_dir=None if args.no_cache else args.cache_dir)
+    if table.empty:
+        print('No runs found in {}'.format(', '.join(args.sources)))
+        return
+    stats = analysis.aggregate(table, args.by)
+    print(stats.to_string())
+    plot_report(table, stats)
+    _finish(args.output, args.show)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Racing portfolio of solutions.
+
+Every racer solves the same instance in its own process under the same
+deadline and sends each improved incumbent to the portfolio, which keeps
+the best one and shares it with the other racers:
+
+ * the racers that take a cutoff (`set_incumbent`, the LP model and the
+   branch and bound) wait a little for the first shared incumbent and
+   only search for better solutions
+ * the racers that take migrants (`accept_bids`, the ACO) run in rounds
+   and adopt the best shared incumbent between two rounds
+
+The race ends when the deadline passes, every racer is done or one of
+them proves its solution optimal, the other racers are then stopped. The
+racers share the CPU time budget and report the CPU time they used.
+"""
+import logging
+import multiprocessing
+import queue
+import time
+
+import aoc_model
+import base_solution
+import branch_and_bound
+import deadline
+import greedy_model
+import lp_model
+
+
+# (solution, keyword arguments) of the default racers
+RACERS = (
+    (greedy_model.GreedyPortfolio, {'jobs': 1}),
+    (aoc_model.AOCBaseSolution, {}),
+    (lp_model.LPModel, {'direct': True}),
+    (branch_and_bound.BranchAndBound, {}),
+)
+
+# seconds between two checks of the racer messages
+POLL_INTERVAL = 0.05
+
+# seconds the racers get to send their result after the deadline, before
+# they are terminated
+GRACE_PERIOD = 1.0
+
+
+class _Shared(object):
+    """The messages the portfolio sent to a racer."""
+
+    def __init__(self, inbox):
+        self._inbox = inbox
+        self.profit = None
+        self.bids = None
+        self.stopped = False
+
+    def _handle(self, message):
+        if message[0] == 'stop':
+            self.stopped = True
+        elif self.profit is None or message[1] > self.profit:
+            _, self.profit, self.bids = message
+
+    def read(self):
+        """Read the pending messages."""
+        while True:
+            try:
+                self._handle(self._inbox.get_nowait())
+            except queue.Empty:
+                return
+
+    def wait(self, timeout):
+        """Wait at most `timeout` seconds for the first incumbent."""
+        try:
+            self._handle(self._inbox.get(timeout=timeout))
+        except queue.Empty:
+            pass
+        self.read()
+
+
+def _race(solution, shared, budget, callback, round_time):
+    """Solve, adopting the shared incumbents every `round_time` seconds."""
+    while True:
+        remaining = budget.remaining()
+        solution.solve(timeout=min(round_time, remaining), callback=callback)
+        shared.read()
+        if shared.stopped or budget.expired():
+            return
+        if shared.profit is not None and shared.profit > solution.get_profit():
+            solution.accept_bids(shared.bids, shared.profit)
+
+
+def _racer(index, inbox, outbox, matrix, name, solution_cls, kwargs, timeout,
+           cpu_timeout, cutoff_wait, round_time):
+    """Worker: run one solution and report its incumbents."""
+    logger = logging.getLogger(__name__)
+    budget = deadline.Deadline(timeout, cpu_timeout)
+    shared = _Shared(inbox)
+    try:
+        solution = solution_cls(matrix, name, logger, **kwargs)
+        if hasattr(solution, 'set_incumbent'):
+            shared.wait(cutoff_wait)
+            if shared.bids is not None:
+                solution.set_incumbent(shared.bids)
+
+        def callback(elapsed, profit):
+            outbox.put(('incumbent', index, profit, solution.winning_bids()))
+            shared.read()
+            return shared.stopped
+
+        if hasattr(solution, 'accept_bids') and budget.bounded:
+            _race(solution, shared, budget, callback, round_time)
+        else:
+            solution.solve(timeout=budget, callback=callback)
+        outbox.put(('done', index, str(solution._get_status()),
+                    solution.get_profit(), solution.winning_bids(),
+                    solution.proved_optimal(),
+                    dict(solution.profile.counters), time.process_time()))
+    except Exception as error:
+        outbox.put(('failed', index,
+                    '{}: {}'.format(type(error).__name__, error),
+                    time.process_time()))
+
+
+class RacingPortfolio(base_solution.BaseSolution):
+    """Race several solutions on the same instance, keep the best one.
+
+    The racers taking a cutoff wait for the first incumbent at most
+    `cutoff_wait` of the time budget (seconds without a budget), the
+    racers taking migrants read the shared incumbent every `round_time`
+    seconds.
+    """
+
+    def __init__(self, bids, name, logger, racers=RACERS, cutoff_wait=0.05,
+                 round_time=1.0):
+        super(RacingPortfolio, self).__init__(bids, name, logger)
+        self._racers = list(racers)
+        self._cutoff_wait = cutoff_wait
+        self._round_time = round_time
+        self._winning = []
+        self._best_profit = 0.0
+        self._optimal = False
+        self.winner = None
+        self.results = {}
+
+    def _get_status(self):
+        return "Optimal" if self._optimal else "Solved"
+
+    def proved_optimal(self):
+        return self._optimal
+
+    def get_profit(self):
+        return self._matrix.total_price(self._winning)
+
+    def _winning_bids(self):
+        return list(self._winning)
+
+    def _extra_summary(self):
+        for name, result in sorted(self.results.items()):
+            self._logger.info("%-18s=> %s", name, result)
+        self._logger.info("Winner            => %s", self.winner)
+
+    def get_summary(self, file_path):
+        summary = super(RacingPortfolio, self).get_summary(file_path)
+        summary["winner"] = self.winner
+        summary["optimal"] = self._optimal
+        summary["racers"] = dict(self.results)
+        return summary
+
+    def _racer_name(self, index):
+        return self._racers[index][0].__name__
+
+    def _improve(self, index, profit, bids, inboxes, running):
+        """Keep a better incumbent and share it with the other racers."""
+        if profit <= self._best_profit:
+            return
+        self._best_profit = profit
+        self._winning = list(bids)
+        self.winner = self._racer_name(index)
+        self._report_incumbent(profit)
+        self.profile.count("shared_incumbents")
+        for other in running:
+            if other != index:
+                inboxes[other].put(('incumbent', profit, self._winning))
+
+    def _solve(self, deadline):
+        self._winning = []
+        self._best_profit = 0.0
+        self._optimal = False
+        self.winner = None
+        self.results = {}
+
+        timeout, cpu_timeout = deadline.worker_budget(
+            1.0 / max(len(self._racers), 1))
+        cutoff_wait = self._cutoff_wait
+        if deadline.bounded:
+            cutoff_wait *= deadline.remaining()
+        outbox = multiprocessing.Queue()
+        inboxes = []
+        processes = []
+        with self.profile.phase("startup"):
+            for index, (solution_cls, kwargs) in enumerate(self._racers):
+                inbox = multiprocessing.Queue()
+                # the racers may never read the incumbents sent to them
+                inbox.cancel_join_thread()
+                process = multiprocessing.Process(
+                    target=_racer,
+                    args=(index, inbox, outbox, self._matrix, self._name,
+                          solution_cls, kwargs, timeout, cpu_timeout,
+                          cutoff_wait, self._round_time),
+                    daemon=True)
+                process.start()
+                inboxes.append(inbox)
+                processes.append(process)
+
+        running = set(range(len(processes)))
+        stop_time = None
+        with self.profile.phase("race"):
+            while running:
+                if stop_time is None and (
+                        deadline.expired() or self._stop_requested):
+                    stop_time = time.monotonic()
+                    for index in running:
+                        inboxes[index].put(('stop',))
+                if (stop_time is not None and
+                        time.monotonic() - stop_time > GRACE_PERIOD):
+                    break
+                try:
+                    message = outbox.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    for index in list(running):
+                        # the racers always report before exiting cleanly
+                        if processes[index].exitcode not in (None, 0):
+                            running.discard(index)
+                            self.results[self._racer_name(index)] = {
+                                "status": "Crashed"}
+                    continue
+
+                kind, index = message[:2]
+                if kind == 'incumbent':
+                    self._improve(index, message[2], message[3], inboxes,
+                                  running)
+                    continue
+                running.discard(index)
+                name = self._racer_name(index)
+                # the CPU time of the racer process, from its start
+                deadline.charge(message[-1])
+                if kind == 'failed':
+                    self._logger.warning("%s failed: %s", name, message[2])
+                    self.results[name] = {"status": "Failed",
+                                          "error": message[2]}
+                    continue
+                _, _, status, profit, bids, optimal, counters, _ = message
+                self.results[name] = {"status": status, "profit": profit,
+                                      "optimal": optimal}
+                self.profile.counters.update(counters)
+                self._improve(index, profit, bids, inboxes, running)
+                if optimal:
+                    # the proof holds for the best profit any racer found
+                    self._optimal = True
+                    break
+
+        with self.profile.phase("stop"):
+            # their incumbents were already sent, the late racers are lost
+            for index in running:
+                processes[index].terminate()
+                processes[index].join()
+                self.results.setdefault(self._racer_name(index),
+                                        {"status": "Stopped"})
+        self.profile.count("racers", len(processes))
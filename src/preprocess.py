@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Instance preprocessing.
+
+Dominated bids are pruned, a bid is dominated if another non empty bid
+asks for a subset of its items at a higher or equal price. The remaining
+bids are split into the connected components of the bid-item graph, the
+components share no item so they can be solved independently, in
+parallel, and the winning bids merged.
+"""
+import concurrent.futures
+import logging
+import os
+import time
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+import base_solution
+
+
+def dominated_bids(matrix):
+    """Return the indices of the dominated bids."""
+    incidence = matrix.incidence().astype(np.int32)
+    overlap = (incidence @ incidence.T).tocoo()
+    bid, other, shared = overlap.row, overlap.col, overlap.data
+
+    sizes, prices = matrix.sizes, matrix.prices
+    # `other` asks for a subset of the items of `bid`
+    subset = (shared == sizes[other]) & (bid != other)
+    # break the ties so that exactly one of identical bids survives
+    better = ((prices[other] > prices[bid]) |
+              ((prices[other] == prices[bid]) &
+               ((sizes[other] < sizes[bid]) |
+                ((sizes[other] == sizes[bid]) & (other < bid)))))
+    return np.unique(bid[subset & better])
+
+
+def prune(matrix):
+    """Drop the dominated bids and the items nobody bids on.
+
+    Return the reduced matrix and the original index of every bid in it.
+    """
+    keep = np.ones(matrix.nr_bids, dtype=bool)
+    keep[dominated_bids(matrix)] = False
+    bids = np.flatnonzero(keep)
+    return matrix.subset(bids), bids
+
+
+def split_components(matrix):
+    """Split the auction in the connected components of the bid-item graph.
+
+    Return a list of `(component_matrix, bid_indices)`, the largest first.
+    """
+    incidence = matrix.incidence()
+    graph = scipy.sparse.bmat([[None, incidence], [incidence.T, None]])
+    _, labels = scipy.sparse.csgraph.connected_components(
+        graph, directed=False)
+    bid_labels = labels[:matrix.nr_bids]
+
+    order = np.argsort(bid_labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(bid_labels[order])) + 1
+    components = [(matrix.subset(bids), bids)
+                  for bids in np.split(order, boundaries)]
+    components.sort(key=lambda component: component[0].nr_bids, reverse=True)
+    return components
+
+
+def _solve_component(solution_cls, matrix, name, timeout, cpu_timeout=None,
+                     params=None, seed=None, expires_at=None):
+    """Return the winning bids of a component and the CPU time used.
+
+    The component stops at `expires_at` on the wall clock at the latest,
+    whenever it leaves the queue of the pool.
+    """
+    cpu_start = time.process_time()
+    if expires_at is not None:
+        timeout = min(timeout, max(expires_at - time.time(), 0.0))
+    if seed is not None:
+        # the pool workers are forked with the random state of the parent
+        np.random.seed(seed)
+    if matrix.nr_bids == 1:
+        # a lonely bid always wins
+        return ([0] if matrix.prices[0] > 0 else []), 0.0
+    model = solution_cls(matrix, name, logging.getLogger(__name__),
+                         **(params or {}))
+    model.solve(timeout=timeout, cpu_timeout=cpu_timeout)
+    return model.winning_bids(), time.process_time() - cpu_start
+
+
+class DecomposedSolution(base_solution.BaseSolution):
+    """Prune the instance, then solve every component with `solution_cls`.
+
+    The components are solved by `jobs` worker processes, each one gets a
+    share of the timeout and of the CPU time budget proportional to its
+    number of bids, and
+    `solution_params` are passed to every component solution.
+    """
+
+    def __init__(self, bids, name, logger, solution_cls=None, jobs=None,
+                 solution_params=None):
+        super(DecomposedSolution, self).__init__(bids, name, logger)
+        self._solution_cls = solution_cls
+        self._solution_params = dict(solution_params or {})
+        self._jobs = jobs or os.cpu_count() or 1
+        self._winning = []
+
+        with self.profile.phase("preprocess"):
+            self._pruned, self._pruned_bids = prune(self._matrix)
+            self._components = split_components(self._pruned)
+        self.profile.count("components", len(self._components))
+
+    def _get_status(self):
+        return "Solved"
+
+    def _winning_bids(self):
+        return list(self._winning)
+
+    def get_profit(self):
+        return self._matrix.total_price(self._winning)
+
+    def _extra_summary(self):
+        self._logger.info("Pruned bids       => %s",
+                          self._matrix.nr_bids - self._pruned.nr_bids)
+        self._logger.info("Components        => %s", len(self._components))
+
+    def get_summary(self, file_path):
+        summary = super(DecomposedSolution, self).get_summary(file_path)
+        summary["solver"] = "Decomposed" + self._solution_cls.__name__
+        summary["nr_pruned_orders"] = self._pruned.nr_bids
+        summary["nr_components"] = len(self._components)
+        return summary
+
+    def _component_budget(self, component, deadline):
+        """Return `(timeout, cpu_timeout)` of a component."""
+        share = component.nr_bids / max(self._pruned.nr_bids, 1)
+        timeout, cpu_timeout = deadline.worker_budget(share)
+        if timeout is not None:
+            # the workers run in parallel, the CPU time adds up
+            workers = min(self._jobs, len(self._components))
+            timeout *= min(share * workers, 1.0)
+        return timeout, cpu_timeout
+
+    def _solve(self, deadline):
+        winning = []
+        futures = {}
+        seeds = np.random.randint(0, 2**31 - 1, size=len(self._components))
+        # the workers share the wall clock of the parent
+        wall_remaining = deadline.wall_remaining()
+        expires_at = (None if wall_remaining is None
+                      else time.time() + wall_remaining)
+        with concurrent.futures.ProcessPoolExecutor(self._jobs) as executor:
+            for index, (component, bids) in enumerate(self._components):
+                if component.nr_bids == 1:
+                    component_winning, _ = _solve_component(
+                        self._solution_cls, component, self._name, None)
+                    winning += bids[component_winning].tolist()
+                    continue
+                name = "{}_component{}".format(self._name, index)
+                # the workers get the seconds left, the deadline stays here
+                timeout, cpu_timeout = self._component_budget(component,
+                                                              deadline)
+                future = executor.submit(
+                    _solve_component, self._solution_cls, component, name,
+                    timeout, cpu_timeout, self._solution_params,
+                    int(seeds[index]), expires_at)
+                futures[future] = bids
+
+            for future in concurrent.futures.as_completed(futures):
+                component_winning, cpu_time = future.result()
+                deadline.charge(cpu_time)
+                winning += futures[future][component_winning].tolist()
+                self._report_incumbent(
+                    self._pruned.total_price(winning))
+
+        self._winning = sorted(self._pruned_bids[winning].tolist())
+
+
+def create_model(solution_cls, bids, name, logger, decompose=False,
+                 params=None):
+    """Create a solution with the given parameters, decomposed in
+    components if asked to.
+    """
+    if decompose:
+        return DecomposedSolution(bids, name, logger,
+                                  solution_cls=solution_cls,
+                                  solution_params=params)
+    return solution_cls(bids, name, logger, **(params or {}))
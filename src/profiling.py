@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Run instrumentation.
+
+A profile keeps nested phase timers and counters, every solution owns one
+and updates it from its loops. Phases are named by their nesting, e.g.
+`solve/sampling`, and their times add up over every time they are
+entered. The profile is saved in the summary of the run:
+
+    {"phases": {"parse": 0.2, "solve": 9.8, ...},
+     "counters": {"epochs": 120, ...}}
+
+With a path, `cprofile()` also dumps the cProfile stats of the block,
+they can be browsed with `snakeviz` or turned into a flame graph with
+`flameprof`.
+"""
+import collections
+import contextlib
+import cProfile
+import os
+import time
+
+
+class Profile(object):
+    """Phase timers and counters of one run."""
+
+    def __init__(self):
+        self.phases = collections.defaultdict(float)
+        self.counters = collections.Counter()
+        self._stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a phase, nested in the phase currently running."""
+        self._stack.append(name)
+        path = "/".join(self._stack)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[path] += time.perf_counter() - start_time
+            self._stack.pop()
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def update(self, other):
+        """Add the phases and counters of another profile."""
+        for path, seconds in other.phases.items():
+            self.phases[path] += seconds
+        self.counters.update(other.counters)
+
+    def as_dict(self):
+        return {
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+        }
+
+
+@contextlib.contextmanager
+def cprofile(path=None):
+    """Dump the cProfile stats of the block to `path`, if any."""
+    if path is None:
+        yield
+        return
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def cprofile_path(directory, solver, file_path, run):
+    """Return the stats file of a run, None without a directory."""
+    if directory is None:
+        return None
+    name = "{}_{}_{}.prof".format(solver, os.path.basename(file_path), run)
+    return os.path.join(directory, name)
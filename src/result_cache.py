@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Content addressed cache of the run results.
+
+A run is keyed by the hash of the dataset contents, the solver class and
+its parameters, the time budget and the version of the solver code, the
+hash of the sources of every module of this package the solver depends
+on. Changing a solver changes its code version, so its old entries are
+never read again and only the runs of that solver are computed again.
+
+Every entry holds the summary and the winning bids of one run, in a JSON
+file named after its key:
+
+    <cache dir>/ab/abcdef....json
+
+Deterministic solvers reuse one run for every repetition. The reuse
+policy decides when the stochastic ones (the ACO solvers) can reuse a
+cached run:
+
+ * `runs` - repetition `i` reuses the cached repetition `i`, raising the
+   number of repetitions only computes the new ones
+ * `deterministic` - the stochastic solvers always run
+ * `never` - every solver runs, the results are still cached
+"""
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+
+import preprocess
+
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'auction_results')
+# bump when the key or the layout of the entries changes
+CACHE_VERSION = 1
+
+REUSE_POLICIES = ('runs', 'deterministic', 'never')
+
+# bytes read at once when hashing a dataset
+CHUNK_SIZE = 1 << 20
+
+
+def dataset_hash(file_path):
+    """Return the sha1 of the contents of a dataset file."""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _qualified_name(obj):
+    return '{}.{}'.format(obj.__module__, obj.__qualname__)
+
+
+def _local_modules(objects):
+    """Return the modules of this package the objects depend on, through
+    their own module and everything it imports, by name.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    modules = {}
+    pending = [inspect.getmodule(obj) for obj in objects]
+    while pending:
+        module = pending.pop()
+        path = getattr(module, '__file__', None)
+        if not path or module.__name__ in modules:
+            continue
+        if os.path.dirname(os.path.abspath(path)) != directory:
+            continue
+        modules[module.__name__] = path
+        pending += [value for value in vars(module).values()
+                    if inspect.ismodule(value)]
+    return modules
+
+
+_code_versions = {}
+
+
+def code_version(solution_cls):
+    """Return the hash of the sources the solution depends on."""
+    name = _qualified_name(solution_cls)
+    version = _code_versions.get(name)
+    if version is None:
+        digest = hashlib.sha1()
+        classes = [cls for cls in solution_cls.__mro__ if cls is not object]
+        for module, path in sorted(_local_modules(classes).items()):
+            digest.update(module.encode('utf-8'))
+            with open(path, 'rb') as fd:
+                digest.update(fd.read())
+        version = _code_versions[name] = digest.hexdigest()
+    return version
+
+
+def solver_params(solution_cls):
+    """Return the default parameters of a solution, by name."""
+    params = {}
+    signature = inspect.signature(solution_cls)
+    for name, parameter in signature.parameters.items():
+        if name in ('bids', 'name', 'logger'):
+            continue
+        if parameter.kind in (parameter.VAR_POSITIONAL,
+                              parameter.VAR_KEYWORD):
+            continue
+        value = parameter.default
+        if inspect.isclass(value):
+            value = _qualified_name(value)
+        params[name] = value
+    return params
+
+
+class ResultCache(object):
+    """Cache of the run results, keyed by the content of the run."""
+
+    def __init__(self, directory=CACHE_DIR, reuse='runs'):
+        if reuse not in REUSE_POLICIES:
+            raise ValueError('Unknown reuse policy {}'.format(reuse))
+        self.directory = os.path.abspath(directory)
+        self.reuse = reuse
+        self._hashes = {}
+
+    def _dataset_hash(self, file_path):
+        stat = os.stat(file_path)
+        stamp = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(stamp)
+        if digest is None:
+            digest = self._hashes[stamp] = dataset_hash(file_path)
+        return digest
+
+    def key(self, file_path, solution_cls, budget, run, decompose=False,
+            params=None):
+        """Return the key of a run.
+
+        `budget` is `(timeout, cpu_timeout, reserve)`, `params` overrides
+        the default parameters of the solution.
+        """
+        all_params = solver_params(solution_cls)
+        all_params.update(params or {})
+        fields = {
+            'version': CACHE_VERSION,
+            'dataset': self._dataset_hash(file_path),
+            'solver': _qualified_name(solution_cls),
+            'params': all_params,
+            'decompose': decompose,
+            'budget': [None if value is None else float(value)
+                       for value in budget],
+            'code': code_version(solution_cls),
+            # the repetitions of a deterministic solver share their result
+            'run': None if solution_cls.DETERMINISTIC else run,
+        }
+        if decompose:
+            fields['preprocess'] = code_version(preprocess.DecomposedSolution)
+        encoded = json.dumps(fields, sort_keys=True, default=repr)
+        return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def reusable(self, solution_cls):
+        """Return true if the policy lets the solution reuse cached runs."""
+        if self.reuse == 'never':
+            return False
+        return self.reuse == 'runs' or solution_cls.DETERMINISTIC
+
+    def get(self, key):
+        """Return the cached `{"summary": ..., "solution": ...}` entry of
+        a run or None.
+        """
+        try:
+            with open(self._path(key), 'r') as fd:
+                return json.load(fd)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, summary, solution):
+        """Save a run, atomically since many workers share the cache."""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=directory)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'w') as tmp_fd:
+                json.dump({'summary': summary,
+                           'solution': [int(bid) for bid in solution]},
+                          tmp_fd)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def lookup(self, file_path, solution_cls, budget, run, decompose=False,
+               params=None):
+        """Return `(key, summary)` of a run, the summary is None unless a
+        reusable run is cached.
+        """
+        key = self.key(file_path, solution_cls, budget, run, decompose,
+                       params)
+        if not self.reusable(solution_cls):
+            return key, None
+        entry = self.get(key)
+        if entry is None:
+            return key, None
+        summary = entry['summary']
+        # the same contents can be found under another path
+        summary['file_path'] = file_path
+        summary['run'] = run
+        summary['cached'] = True
+        return key, summary
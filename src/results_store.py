@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Results store.
+
+Every run summary is appended as one row of a local SQLite database,
+indexed by solver, dataset, timeout and run. SQLite serializes the
+writers, so many worker processes can append to the same store at once.
+
+The JSON summaries of the older experiments (`{"models": [...]}`) can be
+imported and every reader gets the runs back as the same summary dicts.
+
+    python results_store.py import results.sqlite ../data/results
+"""
+import argparse
+import json
+import os
+import sqlite3
+
+
+STORE_NAME = 'results.sqlite'
+
+# seconds a writer waits for the lock held by another process
+BUSY_TIMEOUT = 60
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        solver TEXT,
+        dataset TEXT,
+        timeout REAL,
+        run INTEGER,
+        profit REAL,
+        delta_time REAL,
+        source TEXT,
+        summary TEXT NOT NULL
+    )""",
+    """CREATE INDEX IF NOT EXISTS runs_lookup
+        ON runs (solver, dataset, timeout, run)""",
+    """CREATE TABLE IF NOT EXISTS imports (
+        source TEXT PRIMARY KEY,
+        mtime REAL
+    )""",
+]
+
+
+def _dataset(summary):
+    file_path = summary.get('file_path')
+    if file_path:
+        return os.path.basename(file_path)
+    return summary.get('name')
+
+
+class ResultsStore(object):
+    """Append-only store of run summaries."""
+
+    def __init__(self, path):
+        self._path = os.path.abspath(path)
+        self._connection = sqlite3.connect(self._path, timeout=BUSY_TIMEOUT)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, summary, source=None):
+        self.extend([summary], source)
+
+    def extend(self, summaries, source=None):
+        with self._connection:
+            self._insert(summaries, source)
+
+    def _insert(self, summaries, source):
+        rows = [(summary.get('solver'), _dataset(summary),
+                 summary.get('timeout'), summary.get('run'),
+                 summary.get('profit'), summary.get('delta_time'),
+                 source, json.dumps(summary))
+                for summary in summaries]
+        self._connection.executemany(
+            'INSERT INTO runs (solver, dataset, timeout, run, profit, '
+            'delta_time, source, summary) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            rows)
+
+    def import_json(self, path):
+        """Import a `{"models": [...]}` summary file, only once per version
+        of the file. Return the number of imported runs.
+        """
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime
+        row = self._connection.execute(
+            'SELECT mtime FROM imports WHERE source = ?', (path,)).fetchone()
+        if row is not None and row[0] == mtime:
+            return 0
+
+        with open(path, 'r') as fd:
+            models = json.load(fd).get('models', [])
+        # the file counts as imported only together with its runs
+        with self._connection:
+            self._connection.execute(
+                'DELETE FROM runs WHERE source = ?', (path,))
+            self._insert(models, path)
+            self._connection.execute(
+                'INSERT OR REPLACE INTO imports (source, mtime) VALUES (?, ?)',
+                (path, mtime))
+        return len(models)
+
+    def import_directory(self, directory):
+        """Import every JSON summary found under a directory."""
+        total = 0
+        for root, _, files in os.walk(os.path.abspath(directory)):
+            for name in sorted(files):
+                if name.endswith(('.json', '.josn')):
+                    total += self.import_json(os.path.join(root, name))
+        return total
+
+    def query(self, solver=None, dataset=None, timeout=None, source=None):
+        """Return the summaries matching all the given fields."""
+        conditions = []
+        params = []
+        for column, value in (('solver', solver), ('dataset', dataset),
+                              ('timeout', timeout), ('source', source)):
+            if value is not None:
+                conditions.append('{} = ?'.format(column))
+                params.append(value)
+        sql = 'SELECT summary FROM runs'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id'
+        return [json.loads(row[0])
+                for row in self._connection.execute(sql, params)]
+
+
+def save_summary(summary, store_path):
+    """Append one summary, opening the store only for this write."""
+    with ResultsStore(store_path) as store:
+        store.append(summary)
+
+
+def _matches(summary, source, filters):
+    """Return true if a summary of a JSON file matches all the filters,
+    like the rows selected by `ResultsStore.query`.
+    """
+    fields = {'solver': summary.get('solver'), 'dataset': _dataset(summary),
+              'timeout': summary.get('timeout'), 'source': source}
+    return all(fields[name] == value for name, value in filters.items()
+               if value is not None)
+
+
+def load_models(path, **filters):
+    """Return the summaries of a store, a JSON summary file or a directory
+    of JSON summary files and stores, matching the filters of
+    `ResultsStore.query`.
+    """
+    unknown = set(filters) - {'solver', 'dataset', 'timeout', 'source'}
+    if unknown:
+        raise TypeError('Unknown filters {}'.format(sorted(unknown)))
+    if os.path.isdir(path):
+        models = []
+        for root, _, files in os.walk(os.path.abspath(path), topdown=False):
+            for name in files:
+                if name.endswith(('.json', '.josn', '.sqlite')):
+                    models += load_models(os.path.join(root, name), **filters)
+        return models
+    if path.endswith('.sqlite'):
+        with ResultsStore(path) as store:
+            return store.query(**filters)
+    with open(path, 'r') as fd:
+        models = json.load(fd).get('models', [])
+    source = os.path.abspath(path)
+    return [summary for summary in models
+            if _matches(summary, source, filters)]
+
+
+def get_parser():
+    """Return a CLI parser."""
+    parser = argparse.ArgumentParser(
+        description='Manage the results store.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser(
+        'import', help='Import JSON summaries into the store.')
+    import_parser.add_argument('STORE', type=str, help='SQLite store')
+    import_parser.add_argument('SOURCES', type=str, nargs='+',
+                               help='JSON files or directories')
+
+    export_parser = subparsers.add_parser(
+        'export', help='Export runs as a JSON summary file.')
+    export_parser.add_argument('STORE', type=str, help='SQLite store')
+    export_parser.add_argument('DEST', type=str, help='JSON summary file')
+    export_parser.add_argument('--solver', type=str, default=None)
+    export_parser.add_argument('--timeout', type=float, default=None)
+    return parser
+
+
+def main():
+    """Main entry point."""
+    args = get_parser().parse_args()
+    with ResultsStore(args.STORE) as store:
+        if args.command == 'import':
+            for source in args.SOURCES:
+                if os.path.isdir(source):
+                    total = store.import_directory(source)
+                else:
+                    total = store.import_json(source)
+                print('Imported {} runs from {}'.format(total, source))
+        else:
+            models = store.query(solver=args.solver, timeout=args.timeout)
+            with open(args.DEST, 'w') as fd:
+                json.dump({'models': models}, fd)
+            print('Exported {} runs'.format(len(models)))
+
+
+if __name__ == '__main__':
+    main()
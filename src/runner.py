@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Parallel experiment runner.
+
+Every (dataset, solution, iteration) combination is a task that runs in
+its own process, at most `jobs` at a time. A task that crashes or runs
+over its hard timeout is recorded as a failure and the sweep goes on.
+
+Every worker opens its own connection to the results store and seeds its
+random numbers from its own child of the seed sequence of the sweep, the
+forked workers would otherwise all replay the random numbers of the
+parent. With a
+result cache, the cached runs are appended to the store before the sweep
+starts and only the other tasks run.
+"""
+import collections
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+import numpy as np
+
+import dataset
+import preprocess
+import profiling
+import results_store
+import tuning
+
+
+# seconds between two checks of the running tasks
+POLL_INTERVAL = 0.1
+
+Task = collections.namedtuple(
+    'Task', ['name', 'file_path', 'size', 'solution_cls', 'iteration',
+             'params'])
+
+
+def get_tasks(datasets, solutions, run_times, solver_params=None):
+    """Return every task of the sweep, the largest datasets first.
+
+    `solver_params` are the tuned parameters loaded by `tuning.load`.
+    """
+    tasks = []
+    for name, file_path, size in datasets:
+        for solution_cls in solutions:
+            params = tuning.params_for(solver_params, solution_cls,
+                                       file_path)
+            for iteration in range(run_times):
+                tasks.append(Task(name, file_path, size, solution_cls,
+                                  iteration, params))
+    tasks.sort(key=lambda task: task.size, reverse=True)
+    return tasks
+
+
+def _run_task(task, timeout, cpu_timeout, reserve, use_cache, store_path,
+              logging_lvl, decompose, profile_dir, cache, seed):
+    # own process group, so a timed out task is killed together with the
+    # processes it started (glpsol, ACO islands)
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    np.random.seed(seed.generate_state(1))
+    logging.basicConfig(level=logging_lvl, format='%(asctime)s %(message)s')
+    logger = logging.getLogger(__name__)
+
+    profile = profiling.Profile()
+    with profile.phase("parse"):
+        bids = dataset.load(task.file_path, use_cache=use_cache)
+    logger.info("Creating model %s ...", task.name)
+    with profile.phase("build"):
+        auction_model = preprocess.create_model(
+            task.solution_cls, bids, "model_"+task.name, logger,
+            decompose=decompose, params=task.params)
+    auction_model.profile.update(profile)
+    logger.info("Solving %s ...", task.name)
+    with profiling.cprofile(profiling.cprofile_path(
+            profile_dir, task.solution_cls.__name__, task.file_path,
+            task.iteration)):
+        auction_model.solve(timeout=timeout, cpu_timeout=cpu_timeout,
+                            reserve=reserve)
+    auction_model.summary()
+    summary = auction_model.get_summary(task.file_path)
+    summary['timeout'] = timeout
+    summary['run'] = task.iteration
+    if task.params:
+        summary['params'] = task.params
+    results_store.save_summary(summary, store_path)
+    if cache is not None:
+        key = cache.key(task.file_path, task.solution_cls,
+                        (timeout, cpu_timeout, reserve), task.iteration,
+                        decompose, task.params)
+        cache.put(key, summary, auction_model.winning_bids())
+
+
+def _kill(process):
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+    process.join()
+
+
+def _failure(task, reason, exitcode, delta_time, timeout):
+    return {
+        "status": reason,
+        "failure": reason,
+        "exitcode": exitcode,
+        "delta_time": delta_time,
+        "file_path": task.file_path,
+        "name": "model_"+task.name,
+        "solver": task.solution_cls.__name__,
+        "timeout": timeout,
+        "run": task.iteration,
+    }
+
+
+def run(tasks, store_path, logger, jobs=None, timeout=None,
+        cpu_timeout=None, reserve=0.0, task_timeout=None, use_cache=True,
+        logging_lvl='INFO', decompose=False, profile_dir=None,
+        cache=None):
+    """Run all the tasks on a pool of `jobs` worker processes.
+
+    Failures and cached runs are appended to the results store by this
+    process.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    budget = (timeout, cpu_timeout, reserve)
+    if cache is not None:
+        tasks = _reuse_cached(tasks, cache, budget, store_path, decompose,
+                              logger)
+    seeds = np.random.SeedSequence().spawn(len(tasks))
+    pending = collections.deque(zip(tasks, seeds))
+    running = {}
+    free_slots = list(range(jobs))
+
+    try:
+        _loop(pending, running, free_slots, len(tasks), store_path, logger,
+              budget, task_timeout, use_cache, logging_lvl, decompose,
+              profile_dir, cache)
+    finally:
+        # the workers have their own process group, stop them on errors
+        for process, _, _ in running.values():
+            _kill(process)
+
+
+def _reuse_cached(tasks, cache, budget, store_path, decompose, logger):
+    """Append the cached runs to the store, return the tasks left."""
+    left = []
+    cached = []
+    for task in tasks:
+        _, summary = cache.lookup(task.file_path, task.solution_cls, budget,
+                                  task.iteration, decompose, task.params)
+        if summary is None:
+            left.append(task)
+        else:
+            cached.append(summary)
+    if cached:
+        with results_store.ResultsStore(store_path) as store:
+            store.extend(cached)
+        logger.info("Reused %s cached runs, %s runs left",
+                    len(cached), len(left))
+    return left
+
+
+def _loop(pending, running, free_slots, total, store_path, logger,
+          budget, task_timeout, use_cache, logging_lvl, decompose,
+          profile_dir, cache):
+    timeout = budget[0]
+    done = 0
+    while pending or running:
+        while pending and free_slots:
+            slot = free_slots.pop()
+            task, seed = pending.popleft()
+            process = multiprocessing.Process(
+                target=_run_task,
+                args=(task,) + budget + (use_cache, store_path,
+                                         logging_lvl, decompose,
+                                         profile_dir, cache, seed))
+            process.start()
+            running[slot] = (process, task, time.time())
+
+        time.sleep(POLL_INTERVAL)
+        for slot, (process, task, start_time) in list(running.items()):
+            delta_time = time.time() - start_time
+            failure = None
+            if process.is_alive():
+                if task_timeout is None or delta_time <= task_timeout:
+                    continue
+                _kill(process)
+                failure = 'TimedOut'
+            else:
+                process.join()
+                if process.exitcode != 0:
+                    failure = 'Crashed'
+
+            del running[slot]
+            free_slots.append(slot)
+            done += 1
+            if failure is not None:
+                logger.warning("[%s/%s] %s on %s: %s (exitcode=%s)",
+                               done, total, task.solution_cls.__name__,
+                               task.name, failure, process.exitcode)
+                results_store.save_summary(
+                    _failure(task, failure, process.exitcode, delta_time,
+                             timeout),
+                    store_path)
+            else:
+                logger.info("[%s/%s] %s on %s done in %.2f seconds",
+                            done, total, task.solution_cls.__name__,
+                            task.name, delta_time)
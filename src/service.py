@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Auction clearing service.
+
+An asyncio HTTP/JSON server that clears the auctions it receives with the
+solutions of `main.py`, every request gets its own deadline:
+
+    POST /solve  {"bids": [{"price": 5.0, "items": ["a", "b"]}, ...],
+                  "solver": "GreedyAverageItemsPrice", "timeout": 1.0}
+    -> {"profit": 5.0, "winning_bids": [0, ...], "status": "Solved", ...}
+
+    GET /stats   queue depth, counts and latency percentiles
+
+The solves run in a pool of worker processes, never in the event loop.
+Requests wait in a bounded queue, a full queue answers 503 at once. The
+small instances of the greedy solutions waiting together are sent to a
+worker as one batch, up to `batch_size` requests and `batch_bids` bids,
+so the cost of a round trip to the pool is paid once per batch. The other
+solutions search until their deadline and would use up the time of the
+rest of their batch, they are always solved alone. A request whose
+deadline passes in the queue answers 504 without being solved.
+
+    python service.py serve --port 8080 --workers 4
+    python service.py load ../data/datasets/CAST_test_instance -n 500 -c 16
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+import bid_matrix
+import dataset
+import greedy_model
+import main as experiments
+
+
+SOLUTIONS = {solution_cls.__name__: solution_cls
+             for solution_cls in experiments.SOLUTIONS}
+
+DEFAULT_SOLVER = 'GreedyAverageItemsPrice'
+
+PERCENTILES = (50, 90, 95, 99)
+
+# latencies kept for the percentiles
+LATENCY_WINDOW = 1000
+
+# largest request body accepted, in bytes
+MAX_BODY = 64 << 20
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable',
+           504: 'Gateway Timeout'}
+
+
+class RequestError(Exception):
+    """An error answered to the client with an HTTP status."""
+
+    def __init__(self, status, message):
+        super(RequestError, self).__init__(message)
+        self.status = status
+
+
+def percentiles(values):
+    """Return the latency percentiles in milliseconds."""
+    if not values:
+        return {}
+    points = np.percentile(np.asarray(values) * 1000, PERCENTILES)
+    return {'p{}'.format(percentile): round(float(point), 3)
+            for percentile, point in zip(PERCENTILES, points)}
+
+
+def batchable(solver):
+    """Return true if the run time of a solution doesn't depend on its
+    deadline, so that it can share a worker with other requests.
+    """
+    return issubclass(SOLUTIONS[solver], greedy_model.GreedyBase)
+
+
+def _solve_batch(batch):
+    """Worker: solve the auctions of a batch one after the other."""
+    logger = logging.getLogger(__name__)
+    results = []
+    for solver, matrix, expires_at, reserve in batch:
+        # the workers share the wall clock of the server
+        start_time = time.time()
+        if expires_at is not None and start_time >= expires_at - reserve:
+            results.append({'expired': True, 'start_time': start_time})
+            continue
+        try:
+            solution = SOLUTIONS[solver](matrix, 'service', logger)
+            timeout = None
+            if expires_at is not None:
+                timeout = expires_at - start_time
+            solution.solve(timeout=timeout, reserve=reserve)
+            results.append({
+                'status': str(solution._get_status()),
+                'profit': solution.get_profit(),
+                'winning_bids': sorted(
+                    int(bid) for bid in solution.winning_bids()),
+                'solve_time': solution._delta_time,
+                'start_time': start_time,
+            })
+        except Exception as error:
+            results.append(
+                {'error': '{}: {}'.format(type(error).__name__, error)})
+    return results
+
+
+class _Job(object):
+    """A request waiting for its solution."""
+
+    def __init__(self, solver, matrix, timeout, future):
+        self.solver = solver
+        self.matrix = matrix
+        self.arrival = time.time()
+        self.expires_at = None if timeout is None else self.arrival + timeout
+        self.future = future
+
+    def expired(self, margin=0.0):
+        return (self.expires_at is not None and
+                time.time() >= self.expires_at - margin)
+
+
+def parse_auction(payload, default_timeout, max_timeout):
+    """Return `(solver, matrix, timeout)` of a solve request."""
+    if not isinstance(payload, dict):
+        raise RequestError(400, 'the request must be a JSON object')
+    solver = payload.get('solver', DEFAULT_SOLVER)
+    if solver not in SOLUTIONS:
+        raise RequestError(400, 'unknown solver {}'.format(solver))
+    timeout = payload.get('timeout', default_timeout)
+    if timeout is not None:
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise RequestError(400, 'the timeout must be a positive number')
+        if max_timeout is not None:
+            timeout = min(timeout, max_timeout)
+    try:
+        bids = [(tuple(bid['items']), float(bid['price']))
+                for bid in payload['bids']]
+    except (KeyError, TypeError, ValueError):
+        raise RequestError(
+            400, 'bids must be a list of {"price": ..., "items": [...]}')
+    return solver, bid_matrix.BidMatrix.from_bids(bids), timeout
+
+
+class AuctionService(object):
+    """Queue, batch and solve the auctions of the HTTP requests."""
+
+    def __init__(self, workers=None, max_queue=256, batch_size=16,
+                 batch_bids=5000, default_timeout=1.0, max_timeout=None,
+                 reserve=0.05):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_bids = batch_bids
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.reserve = reserve
+
+        self._pool = None
+        self._dispatcher = None
+        self._pending = collections.deque()
+        self._ready = None
+        self._slots = None
+        self._in_flight = 0
+        self.counters = collections.Counter()
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._solve_latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._batch_sizes = collections.deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self):
+        self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        self._ready = asyncio.Event()
+        # a batch per worker, the other requests wait in the queue
+        self._slots = asyncio.Semaphore(self.workers)
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def stop(self):
+        self._dispatcher.cancel()
+        try:
+            await self._dispatcher
+        except asyncio.CancelledError:
+            pass
+        for job in self._pending:
+            job.future.set_exception(RequestError(503, 'shutting down'))
+        self._pending.clear()
+        self._pool.shutdown(wait=True)
+
+    def stats(self):
+        batches = list(self._batch_sizes)
+        return {
+            'queue_depth': len(self._pending),
+            'max_queue': self.max_queue,
+            'in_flight': self._in_flight,
+            'workers': self.workers,
+            'counters': dict(self.counters),
+            'mean_batch_size': (sum(batches) / len(batches)
+                                if batches else None),
+            'latency_ms': percentiles(list(self._latencies)),
+            'solve_latency_ms': percentiles(list(self._solve_latencies)),
+        }
+
+    async def solve(self, payload):
+        """Queue a solve request and return its result."""
+        solver, matrix, timeout = parse_auction(
+            payload, self.default_timeout, self.max_timeout)
+        if len(self._pending) >= self.max_queue:
+            self.counters['rejected'] += 1
+            raise RequestError(503, 'the queue is full')
+        job = _Job(solver, matrix, timeout,
+                   asyncio.get_event_loop().create_future())
+        self._pending.append(job)
+        self._ready.set()
+        self.counters['accepted'] += 1
+        result = await job.future
+        # the time waiting in the queue, the pool and the batch
+        result['queue_time'] = result.pop('start_time') - job.arrival
+        self._latencies.append(time.time() - job.arrival)
+        return result
+
+    def _next_batch(self):
+        """Pop the next batch, the expired requests are answered."""
+        batch = []
+        size = 0
+        while self._pending and len(batch) < self.batch_size:
+            job = self._pending[0]
+            # no time would be left to solve after the reserve
+            if job.expired(self.reserve):
+                self._pending.popleft()
+                self.counters['expired'] += 1
+                job.future.set_exception(
+                    RequestError(504, 'the deadline passed in the queue'))
+                continue
+            if batch and (size + job.matrix.nr_bids > self.batch_bids or
+                          not batchable(job.solver)):
+                break
+            batch.append(self._pending.popleft())
+            size += job.matrix.nr_bids
+            if not batchable(job.solver):
+                break
+        return batch
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            batch = []
+            while not batch:
+                while not self._pending:
+                    self._ready.clear()
+                    await self._ready.wait()
+                batch = self._next_batch()
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_event_loop()
+        self._in_flight += len(batch)
+        self._batch_sizes.append(len(batch))
+        self.counters['batches'] += 1
+        try:
+            results = await loop.run_in_executor(
+                self._pool, _solve_batch,
+                [(job.solver, job.matrix, job.expires_at, self.reserve)
+                 for job in batch])
+        except Exception as error:
+            results = [{'error': '{}: {}'.format(type(error).__name__,
+                                                 error)}] * len(batch)
+        finally:
+            self._in_flight -= len(batch)
+            self._slots.release()
+        for job, result in zip(batch, results):
+            if result.get('expired'):
+                self.counters['expired'] += 1
+                job.future.set_exception(
+                    RequestError(504, 'the deadline passed in the queue'))
+                continue
+            if 'error' in result:
+                self.counters['failed'] += 1
+                job.future.set_exception(RequestError(500, result['error']))
+                continue
+            self.counters['solved'] += 1
+            self._solve_latencies.append(result['solve_time'])
+            job.future.set_result(result)
+
+    async def handle(self, method, path, body):
+        """Return the status and the JSON payload of a request."""
+        if path == '/stats':
+            if method != 'GET':
+                raise RequestError(405, 'use GET')
+            return 200, self.stats()
+        if path == '/solve':
+            if method != 'POST':
+                raise RequestError(405, 'use POST')
+            try:
+                payload = json.loads(body.decode('utf-8'))
+            except ValueError:
+                raise RequestError(400, 'the body is not JSON')
+            return 200, await self.solve(payload)
+        raise RequestError(404, 'unknown path {}'.format(path))
+
+
+async def read_message(reader):
+    """Read an HTTP message, return `(start_line, headers, body)` or None
+    once the connection is closed.
+    """
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        raise RequestError(413, 'the body is larger than {}'.format(MAX_BODY))
+    body = await reader.readexactly(length) if length else b''
+    return start_line.decode('latin-1').strip(), headers, body
+
+
+def write_message(writer, start_line, payload, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    lines = [start_line, 'Content-Type: application/json',
+             'Content-Length: {}'.format(len(body))] + list(headers)
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+
+def _respond(writer, status, payload, keep_alive):
+    headers = ['Retry-After: 1'] if status == 503 else []
+    if not keep_alive:
+        headers.append('Connection: close')
+    write_message(writer, 'HTTP/1.1 {} {}'.format(
+        status, REASONS.get(status, '')), payload, headers)
+
+
+async def serve_connection(service, reader, writer):
+    """Answer the requests of a keep-alive connection."""
+    try:
+        while True:
+            try:
+                message = await read_message(reader)
+            except (RequestError, ValueError) as error:
+                # the rest of the message can't be read, close
+                _respond(writer, getattr(error, 'status', 400),
+                         {'error': str(error)}, False)
+                await writer.drain()
+                break
+            if message is None:
+                break
+            start_line, headers, body = message
+            try:
+                method, path, _ = start_line.split(' ', 2)
+                status, payload = await service.handle(method, path, body)
+            except RequestError as error:
+                status, payload = error.status, {'error': str(error)}
+            except ValueError:
+                status, payload = 400, {'error': 'malformed request line'}
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            _respond(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, service, logger):
+    await service.start()
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_connection(service, reader, writer),
+        host, port)
+    logger.info("Serving on %s:%s with %s workers", host, port,
+                service.workers)
+    try:
+        await server.serve_forever()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+
+
+async def request(reader, writer, host, method, path, payload=None):
+    """Send a request on an open connection, return its status and JSON
+    payload.
+    """
+    body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    head = ['{} {} HTTP/1.1'.format(method, path), 'Host: {}'.format(host),
+            'Content-Type: application/json',
+            'Content-Length: {}'.format(len(body))]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+    message = await read_message(reader)
+    if message is None:
+        raise ConnectionError('the server closed the connection')
+    start_line, _, body = message
+    return int(start_line.split(' ')[1]), json.loads(body.decode('utf-8'))
+
+
+def auction_payload(file_path, solver, timeout):
+    """Return the solve request of a dataset file."""
+    matrix = dataset.load(file_path)
+    bids = [{'price': float(matrix.prices[bid]),
+             'items': matrix.bundle(bid).tolist()}
+            for bid in range(matrix.nr_bids)]
+    return {'bids': bids, 'solver': solver, 'timeout': timeout}
+
+
+async def load_test(host, port, payloads, total, concurrency):
+    """Send `total` requests over `concurrency` connections, return the
+    status counts, the latencies and the stats of the server.
+    """
+    statuses = collections.Counter()
+    latencies = []
+    sent = 0
+
+    async def client():
+        nonlocal sent
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while sent < total:
+                payload = payloads[sent % len(payloads)]
+                sent += 1
+                start_time = time.time()
+                status, _ = await request(reader, writer, host, 'POST',
+                                          '/solve', payload)
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(time.time() - start_time)
+        finally:
+            writer.close()
+
+    start_time = time.time()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.time() - start_time
+    reader, writer = await asyncio.open_connection(host, port)
+    _, stats = await request(reader, writer, host, 'GET', '/stats')
+    writer.close()
+    return statuses, latencies, elapsed, stats
+
+
+def get_parser():
+    """Return a CLI parser."""
+    parser = argparse.ArgumentParser(
+        description='Auction clearing service.')
+    # the address of the service, for both commands
+    address_parser = argparse.ArgumentParser(add_help=False)
+    address_parser.add_argument('--host', type=str, default='127.0.0.1')
+    address_parser.add_argument('--port', type=int, default=8080)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', parents=[address_parser],
+                                         help='Run the service.')
+    serve_parser.add_argument('-w', '--workers', type=int, default=None,
+                              help='Solver processes (default one per '
+                                   'core).')
+    serve_parser.add_argument('--max-queue', type=int, default=256,
+                              help='Requests waiting before the service '
+                                   'answers 503.')
+    serve_parser.add_argument('--batch-size', type=int, default=16,
+                              help='Greedy requests solved by a worker at '
+                                   'once.')
+    serve_parser.add_argument('--batch-bids', type=int, default=5000,
+                              help='Bids of a batch, larger instances are '
+                                   'solved alone.')
+    serve_parser.add_argument('-t', '--timeout', type=float, default=1.0,
+                              help='Deadline of the requests without one.')
+    serve_parser.add_argument('--max-timeout', type=float, default=None,
+                              help='Longest deadline a request can ask for.')
+    serve_parser.add_argument('--reserve', type=float, default=0.05,
+                              help='Seconds before the deadline reserved '
+                                   'for answering.')
+
+    load_parser = subparsers.add_parser(
+        'load', parents=[address_parser],
+        help='Send the datasets of a directory to the service.')
+    load_parser.add_argument('DATASETS', type=str,
+                             help='Directory of datasets.')
+    load_parser.add_argument('-n', '--requests', type=int, default=100)
+    load_parser.add_argument('-c', '--concurrency', type=int, default=8,
+                             help='Open connections.')
+    load_parser.add_argument('-s', '--solver', type=str,
+                             default=DEFAULT_SOLVER, choices=sorted(SOLUTIONS))
+    load_parser.add_argument('-t', '--timeout', type=float, default=1.0)
+    return parser
+
+
+def main():
+    """Main entry point."""
+    args = get_parser().parse_args()
+    logging.basicConfig(level='INFO', format='%(asctime)s %(message)s')
+    logger = logging.getLogger(__name__)
+
+    if args.command == 'serve':
+        service = AuctionService(
+            workers=args.workers, max_queue=args.max_queue,
+            batch_size=args.batch_size, batch_bids=args.batch_bids,
+            default_timeout=args.timeout, max_timeout=args.max_timeout,
+            reserve=args.reserve)
+        try:
+            asyncio.run(serve(args.host, args.port, service, logger))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    payloads = [auction_payload(file_path, args.solver, args.timeout)
+                for _, file_path, _ in experiments.get_datasets(args.DATASETS)]
+    statuses, latencies, elapsed, stats = asyncio.run(load_test(
+        args.host, args.port, payloads, args.requests, args.concurrency))
+    print('{} requests in {:.2f} seconds, {:.1f} per second'.format(
+        sum(statuses.values()), elapsed, sum(statuses.values()) / elapsed))
+    print('Statuses: {}'.format(dict(statuses)))
+    print('Client latency (ms): {}'.format(percentiles(latencies)))
+    print('Server stats: {}'.format(json.dumps(stats)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Parameter tuning of the ACO solutions.
+
+Random configurations of the colony parameters are raced by successive
+halving on the instances of a family, a directory of datasets: every
+round runs the surviving configurations on every instance, in parallel,
+keeps the best `1/eta` of them and gives the next round `eta` times the
+time budget. A configuration scores the mean over the instances of its
+profit relative to the best profit of the round on the instance.
+
+The best configuration of every family is saved in a JSON file, later
+tunings of other families are merged into it, and `main.py` runs the
+solutions with them when given `--solver-params`:
+
+    python tuning.py tune ../data/custom_dataset -o aco_params.json
+    python tuning.py show aco_params.json
+    python main.py -s AOCBaseSolution --solver-params aco_params.json
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import random
+
+import numpy as np
+
+import aoc_model
+import aoc_model_second_generation
+import dataset
+import result_cache
+
+
+SOLUTIONS = {
+    solution_cls.__name__: solution_cls
+    for solution_cls in (
+        aoc_model.AOCBaseSolution,
+        aoc_model_second_generation.AOCBaseSolutionSecondGeneration)
+}
+
+# values tried for every parameter of the colony
+SPACE = {
+    'ant_count': [10, 30, 100, 300, 1000],
+    'pheromone_decay': [0.5, 0.7, 0.9, 0.95, 0.99],
+    'pheromone_power': [0.25, 0.5, 1.0, 2.0],
+    'greedy_power': [0.25, 0.5, 1.0, 2.0],
+}
+
+
+def family(file_path):
+    """Return the family of a dataset, the name of its directory."""
+    return os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+
+
+def load(path):
+    """Return the tuned parameters saved in a JSON file."""
+    with open(path, 'r') as fd:
+        return json.load(fd)
+
+
+def params_for(solver_params, solution_cls, file_path):
+    """Return the tuned parameters of a solution on a dataset, empty if
+    its family was not tuned.
+    """
+    if not solver_params:
+        return {}
+    tuned = solver_params.get(solution_cls.__name__, {}).get(
+        family(file_path))
+    if tuned is None:
+        return {}
+    return dict(tuned['params'])
+
+
+def save(path, solution_name, family_name, tuned):
+    """Save the tuned parameters of a family, keeping the other ones."""
+    solver_params = load(path) if os.path.exists(path) else {}
+    solver_params.setdefault(solution_name, {})[family_name] = tuned
+    with open(path, 'w') as fd:
+        json.dump(solver_params, fd, indent=1, sort_keys=True)
+
+
+def sample_configs(solution_cls, count, seed=0):
+    """Return `count` distinct configurations, the defaults first."""
+    defaults = result_cache.solver_params(solution_cls)
+    configs = [{name: defaults[name] for name in SPACE}]
+    size = np.prod([len(values) for values in SPACE.values()])
+    generator = random.Random(seed)
+    while len(configs) < min(count, size):
+        config = {name: generator.choice(values)
+                  for name, values in SPACE.items()}
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+
+def get_files(directory, limit=None):
+    """Return the datasets of a family, the smallest first."""
+    files = []
+    for name in os.listdir(directory):
+        file_path = os.path.join(directory, name)
+        if os.path.isfile(file_path) and not dataset.is_cache(file_path):
+            files.append((os.stat(file_path).st_size, file_path))
+    files.sort()
+    return [file_path for _, file_path in files[:limit]]
+
+
+def _evaluate(solution_name, params, file_path, budget, seed):
+    """Worker: return the profit of one configuration on one dataset."""
+    # every configuration sees the same random numbers on an instance
+    np.random.seed(seed)
+    matrix = dataset.load(file_path)
+    model = SOLUTIONS[solution_name](
+        matrix, 'tuning', logging.getLogger(__name__), **params)
+    model.solve(timeout=budget)
+    return model.get_profit()
+
+
+def successive_halving(solution_name, configs, files, budget, eta=2,
+                       jobs=None, seed=0, logger=None):
+    """Race the configurations on the files, return the best one as
+    `(config, score, budgets)` with the budget of every round.
+    """
+    logger = logger or logging.getLogger(__name__)
+    survivors = list(range(len(configs)))
+    scores = np.ones(len(configs))
+    budgets = []
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        # a single configuration still runs one round to get its score
+        while True:
+            futures = {}
+            for config in survivors:
+                for column, file_path in enumerate(files):
+                    future = executor.submit(
+                        _evaluate, solution_name, configs[config],
+                        file_path, budget, seed + column)
+                    futures[future] = (config, column)
+            profits = np.zeros((len(configs), len(files)))
+            for future in concurrent.futures.as_completed(futures):
+                profits[futures[future]] = future.result()
+
+            best = profits[survivors].max(axis=0)
+            relative = profits[survivors] / np.where(best > 0, best, 1)
+            scores[survivors] = relative.mean(axis=1)
+            budgets.append(budget)
+            survivors.sort(key=lambda config: -scores[config])
+            logger.info("Round %s, %s configurations at %gs, best %s "
+                        "scores %.4f", len(budgets), len(survivors), budget,
+                        configs[survivors[0]], scores[survivors[0]])
+            survivors = survivors[:max(1, len(survivors) // eta)]
+            if len(survivors) == 1:
+                break
+            budget *= eta
+    return configs[survivors[0]], float(scores[survivors[0]]), budgets
+
+
+def get_parser():
+    """Return a CLI parser."""
+    parser = argparse.ArgumentParser(
+        description='Tune the parameters of the ACO solutions.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tune_parser = subparsers.add_parser(
+        'tune', help='Tune a solution on dataset families.')
+    tune_parser.add_argument(
+        'FAMILIES', type=str, nargs='*',
+        default=[os.path.join('..', 'data', 'custom_dataset')],
+        help='Directories of datasets, tuned separately.')
+    tune_parser.add_argument('-s', '--solution', type=str,
+                             default=aoc_model.AOCBaseSolution.__name__,
+                             choices=sorted(SOLUTIONS))
+    tune_parser.add_argument('-c', '--configs', type=int, default=16,
+                             help='Configurations of the first round.')
+    tune_parser.add_argument('-b', '--budget', type=float, default=0.5,
+                             help='Seconds per run in the first round.')
+    tune_parser.add_argument('--eta', type=int, default=2,
+                             help='Fraction of the configurations kept '
+                                  'and budget growth of every round.')
+    tune_parser.add_argument('-l', '--limit', type=int, default=None,
+                             help='Datasets per family, the smallest first.')
+    tune_parser.add_argument('-j', '--jobs', type=int, default=None,
+                             help='Worker processes (default one per core).')
+    tune_parser.add_argument('--seed', type=int, default=0)
+    tune_parser.add_argument('-o', '--output', type=str,
+                             default='solver_params.json',
+                             help='JSON file of the tuned parameters.')
+
+    show_parser = subparsers.add_parser(
+        'show', help='Print the tuned parameters.')
+    show_parser.add_argument('PARAMS', type=str, help='JSON file')
+    return parser
+
+
+def main():
+    """Main entry point."""
+    args = get_parser().parse_args()
+    logging.basicConfig(level='INFO', format='%(asctime)s %(message)s')
+    logger = logging.getLogger(__name__)
+
+    if args.command == 'show':
+        for solution_name, families in sorted(load(args.PARAMS).items()):
+            for family_name, tuned in sorted(families.items()):
+                print('{:35} {:20} {:.4f} {}'.format(
+                    solution_name, family_name, tuned['score'],
+                    tuned['params']))
+        return
+
+    solution_cls = SOLUTIONS[args.solution]
+    configs = sample_configs(solution_cls, args.configs, args.seed)
+    for directory in args.FAMILIES:
+        files = get_files(directory, args.limit)
+        family_name = os.path.basename(os.path.abspath(directory))
+        logger.info("Tuning %s on %s, %s datasets", args.solution,
+                    family_name, len(files))
+        config, score, budgets = successive_halving(
+            args.solution, configs, files, args.budget, args.eta,
+            args.jobs, args.seed, logger)
+        save(args.output, args.solution, family_name,
+             {'params': config, 'score': score, 'budgets': budgets,
+              'datasets': len(files)})
+        logger.info("Best configuration of %s: %s", family_name, config)
+
+
+if __name__ == '__main__':
+    main()